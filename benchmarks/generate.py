@@ -0,0 +1,246 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from datetime import timedelta
+from itertools import accumulate
+from pathlib import Path
+from random import Random
+from sqlite3 import Connection
+from sqlite3 import connect
+from typing import Any
+from typing import Callable
+from typing import Generator
+from typing import Iterable
+
+from falocalrepo_database import Database
+from falocalrepo_database.column import Column
+from falocalrepo_database.column import Encoder
+from falocalrepo_database.column import get_encoder
+from falocalrepo_database.tables import CommentsColumns
+from falocalrepo_database.tables import JournalsColumns
+from falocalrepo_database.tables import SubmissionsColumns
+from falocalrepo_database.tables import UsersColumns
+from falocalrepo_database.tables import comments_table
+from falocalrepo_database.tables import journals_table
+from falocalrepo_database.tables import submissions_table
+from falocalrepo_database.tables import users_table
+from falocalrepo_database.util import tiered_path
+
+# Number of submissions, users, journals, and comments are derived from it
+sizes: dict[str, int] = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+_words: list[str] = ["fox", "wolf", "dragon", "cat", "dog", "digital", "sketch", "commission", "ych", "comic", "forest",
+                     "night", "portrait", "traditional", "pencil", "color", "happy", "winter", "summer", "cute",
+                     "feral", "anthro", "painting", "adoptable", "reference", "sheet", "badge", "icon", "animation",
+                     "music", "story", "poem", "chapter", "stream", "raffle", "auction", "sale", "update", "news"]
+_categories: list[str] = ["Artwork (Digital)", "Artwork (Traditional)", "Story", "Music", "Photography", "Sculpting"]
+_species: list[str] = ["Fox", "Wolf", "Dragon", "Feline", "Canine", "Avian", "Unspecified / Any"]
+_genders: list[str] = ["Male", "Female", "Any", "Multiple characters"]
+_ratings: list[str] = ["General", "Mature", "Adult"]
+_types: list[tuple[str, str]] = [("image", "png"), ("image", "jpg"), ("image", "gif"), ("text", "txt"),
+                                 ("music", "mp3"), ("flash", "swf")]
+_start_date: datetime = datetime(2005, 12, 1)
+_date_range: int = int((datetime(2024, 1, 1) - _start_date).total_seconds())
+
+
+class DataGenerator:
+    def __init__(self, submissions: int, seed: int = 0):
+        self.rng: Random = Random(seed)
+        self.submissions: int = submissions
+        self.users: int = max(submissions // 100, 10)
+        self.journals: int = max(submissions // 4, 1)
+        self.comments: int = submissions
+        self.usernames: list[str] = [f"user{n}" for n in range(self.users)]
+        # Zipf-like distribution, few users author most of the content
+        self._cum_weights: list[float] = list(accumulate(1 / (n + 1) for n in range(self.users)))
+
+    def author(self) -> str:
+        return self.rng.choices(self.usernames, cum_weights=self._cum_weights)[0]
+
+    def users_sample(self, k: int) -> set[str]:
+        return set(self.rng.sample(self.usernames, k))
+
+    def date(self) -> datetime:
+        return (_start_date + timedelta(seconds=self.rng.randrange(_date_range))).replace(second=0, microsecond=0)
+
+    def text(self, words: int) -> str:
+        return " ".join(self.rng.choices(_words, k=words))
+
+    def html(self, paragraphs: int) -> str:
+        return "".join(f"<p>{self.text(self.rng.randint(5, 40))}</p>" for _ in range(paragraphs))
+
+    def user_entries(self) -> Generator[dict[str, Any], None, None]:
+        for username in self.usernames:
+            yield {
+                UsersColumns.USERNAME.name: username,
+                UsersColumns.FOLDERS.name: set(self.rng.sample(["gallery", "scraps", "favorites", "journals"],
+                                                               self.rng.randint(1, 4))),
+                UsersColumns.ACTIVE.name: self.rng.random() > .1,
+                UsersColumns.USERPAGE.name: self.html(self.rng.randint(1, 3)),
+            }
+
+    def submission_entry(self, id_: int) -> dict[str, Any]:
+        type_, ext = self.rng.choice(_types)
+        author: str = self.author()
+        return {
+            SubmissionsColumns.ID.name: id_,
+            SubmissionsColumns.AUTHOR.name: author,
+            SubmissionsColumns.TITLE.name: self.text(self.rng.randint(1, 6)).title(),
+            SubmissionsColumns.DATE.name: self.date(),
+            SubmissionsColumns.DESCRIPTION.name: self.html(self.rng.randint(1, 5)),
+            SubmissionsColumns.FOOTER.name: self.html(self.rng.random() < .3),
+            SubmissionsColumns.TAGS.name: self.rng.sample(_words, self.rng.randint(0, 12)),
+            SubmissionsColumns.CATEGORY.name: self.rng.choice(_categories),
+            SubmissionsColumns.SPECIES.name: self.rng.choice(_species),
+            SubmissionsColumns.GENDER.name: self.rng.choice(_genders),
+            SubmissionsColumns.RATING.name: self.rng.choice(_ratings),
+            SubmissionsColumns.TYPE.name: type_,
+            SubmissionsColumns.FILEURL.name: [f"https://d.furaffinity.net/art/{author}/{id_}/{id_}.{author}.{ext}"],
+            SubmissionsColumns.FILEEXT.name: [ext],
+            SubmissionsColumns.FILESAVED.name: 0b111,
+            SubmissionsColumns.FAVORITE.name: self.users_sample(min(int(self.rng.expovariate(.3)), self.users)),
+            SubmissionsColumns.MENTIONS.name: self.users_sample(min(int(self.rng.expovariate(1.5)), self.users)),
+            SubmissionsColumns.FOLDER.name: "gallery" if self.rng.random() < .8 else "scraps",
+            SubmissionsColumns.USERUPDATE.name: self.rng.random() < .5,
+        }
+
+    def journal_entry(self, id_: int) -> dict[str, Any]:
+        return {
+            JournalsColumns.ID.name: id_,
+            JournalsColumns.AUTHOR.name: self.author(),
+            JournalsColumns.TITLE.name: self.text(self.rng.randint(1, 6)).title(),
+            JournalsColumns.DATE.name: self.date(),
+            JournalsColumns.CONTENT.name: self.html(self.rng.randint(1, 8)),
+            JournalsColumns.HEADER.name: self.html(self.rng.random() < .2),
+            JournalsColumns.FOOTER.name: self.html(self.rng.random() < .2),
+            JournalsColumns.MENTIONS.name: self.users_sample(min(int(self.rng.expovariate(1.5)), self.users)),
+            JournalsColumns.USERUPDATE.name: self.rng.random() < .5,
+        }
+
+    # Comments are grouped in threads under random parents, each comment replies to an earlier one of the same parent
+    def comment_entries(self) -> Generator[dict[str, Any], None, None]:
+        id_: int = 0
+        while id_ < self.comments:
+            parent_table: str = submissions_table if self.rng.random() < .8 else journals_table
+            parent_id: int = self.rng.randint(1, self.submissions if parent_table == submissions_table else
+                                              self.journals)
+            first_id: int = id_ + 1
+            for _ in range(min(self.rng.randint(1, 30), self.comments - id_)):
+                id_ += 1
+                yield {
+                    CommentsColumns.ID.name: id_,
+                    CommentsColumns.PARENT_TABLE.name: parent_table,
+                    CommentsColumns.PARENT_ID.name: parent_id,
+                    CommentsColumns.REPLY_TO.name: self.rng.randint(first_id, id_ - 1)
+                    if id_ > first_id and self.rng.random() < .6 else None,
+                    CommentsColumns.AUTHOR.name: self.author(),
+                    CommentsColumns.DATE.name: self.date(),
+                    CommentsColumns.TEXT.name: self.text(self.rng.randint(1, 60)),
+                }
+
+    def file(self, ext: str, size: int) -> bytes:
+        header: bytes = {"png": b"\x89PNG\r\n\x1a\n", "jpg": b"\xff\xd8\xff\xe0", "gif": b"GIF89a",
+                         "mp3": b"ID3\x03\x00", "swf": b"FWS\x08"}.get(ext, b"")
+        return header + self.rng.randbytes(max(size - len(header), 0))
+
+
+def _insert_entries(conn: Connection, table: str, columns: list[Column], entries: Iterable[dict[str, Any]],
+                    batch_size: int = 10000):
+    encoder: Encoder = get_encoder(tuple(columns))
+    sql: str = f"insert into {table} ({','.join(c.name for c in columns)}) values ({','.join('?' * len(columns))})"
+    batch: list[tuple] = []
+    for entry in entries:
+        batch.append(encoder.encode_tuple(entry))
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            batch = []
+    conn.executemany(sql, batch)
+
+
+def _write_files(files_folder: Path, submission: dict[str, Any], generator: DataGenerator, file_size: int):
+    folder: Path = files_folder / tiered_path(submission[SubmissionsColumns.ID.name])
+    folder.mkdir(parents=True, exist_ok=True)
+    ext: str = submission[SubmissionsColumns.FILEEXT.name][0]
+    folder.joinpath(f"submission.{ext}").write_bytes(generator.file(ext, file_size))
+    folder.joinpath("thumbnail.jpg").write_bytes(generator.file("jpg", max(file_size // 8, 64)))
+
+
+def generate_database(path: Path, submissions: int, *, seed: int = 0, files: bool = True, file_size: int = 1024
+                      ) -> dict[str, int]:
+    path.unlink(missing_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    generator: DataGenerator = DataGenerator(submissions, seed)
+
+    with Database(path, init=True, check_connections=False) as db:
+        files_folder: Path = db.settings.files_folder
+        conn: Connection = db.connection
+        db.commit()
+        conn.execute("pragma synchronous = 0")
+        conn.execute("pragma journal_mode = memory")
+
+        def submission_entries() -> Generator[dict[str, Any], None, None]:
+            for id_ in range(1, submissions + 1):
+                entry: dict[str, Any] = generator.submission_entry(id_)
+                if files:
+                    _write_files(files_folder, entry, generator, file_size)
+                else:
+                    entry[SubmissionsColumns.FILESAVED.name] = 0
+                yield entry
+
+        _insert_entries(conn, db.users.name, db.users.columns, generator.user_entries())
+        _insert_entries(conn, db.submissions.name, db.submissions.columns, submission_entries())
+        _insert_entries(conn, db.journals.name, db.journals.columns,
+                        map(generator.journal_entry, range(1, generator.journals + 1)))
+        _insert_entries(conn, db.comments.name, db.comments.columns, generator.comment_entries())
+        db.history.add_event("benchmark data generated")
+        db.commit()
+
+        return {t.name: len(t) for t in (db.users, db.submissions, db.journals, db.comments)}
+
+
+# Populate a database created by one of the falocalrepo_database.update.make_database_* functions, only the columns
+# present in its schema are filled
+def generate_legacy_database(path: Path, make_database: Callable[[Connection], Connection], submissions: int, *,
+                             seed: int = 0):
+    path.unlink(missing_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    generator: DataGenerator = DataGenerator(submissions, seed)
+    conn: Connection = make_database(connect(path))
+    conn.execute("pragma synchronous = 0")
+
+    def legacy_entries(table: str, columns_class: type, entries: Iterable[dict[str, Any]]):
+        names: list[str] = [n for _, n, *_ in conn.execute(f"pragma table_info({table})")]
+        columns: list[Column] = [getattr(columns_class, n, None) or Column(n, str) for n in names]
+        defaults: dict[str, Any] = {"FOOTER": "", "HEADER": "", "ACTIVE": True}
+        _insert_entries(conn, table, columns, ({n: e.get(n, defaults.get(n)) for n in names} for e in entries))
+
+    legacy_entries(users_table, UsersColumns, generator.user_entries())
+    legacy_entries(submissions_table, SubmissionsColumns,
+                   (e | {SubmissionsColumns.FILESAVED.name: 3} for e in map(generator.submission_entry,
+                                                                            range(1, submissions + 1))))
+    legacy_entries(journals_table, JournalsColumns, map(generator.journal_entry, range(1, generator.journals + 1)))
+    if conn.execute("select 1 from sqlite_master where name = ?", [comments_table]).fetchone():
+        legacy_entries(comments_table, CommentsColumns, generator.comment_entries())
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = ArgumentParser(description="Generate a synthetic falocalrepo database for benchmarks.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--size", choices=sizes.keys(), default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-files", dest="files", action="store_false")
+    parser.add_argument("--file-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    for table, rows in generate_database(args.path, sizes[args.size], seed=args.seed, files=args.files,
+                                         file_size=args.file_size).items():
+        print(f"{table}: {rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from argparse import ArgumentParser
+from json import dumps
+from re import match
+from statistics import median
+from subprocess import run
+from sys import executable
+from sys import exit as sys_exit
+
+# Import statement -> maximum median import time in microseconds, interpreter startup imports excluded
+budgets: dict[str, int] = {
+    "import falocalrepo_database": 5_000,
+    "from falocalrepo_database import Database": 60_000,
+}
+
+# Modules that must not be loaded by a plain import of the package or by opening a database
+deferred_modules: list[str] = [
+    "psutil",
+    "chardet",
+    "filetype",
+    "json",
+    "falocalrepo_database.update",
+]
+
+
+def import_time(statement: str) -> tuple[int, set[str]]:
+    result = run([executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True)
+    total: int = 0
+    modules: set[str] = set()
+    for line in result.stderr.splitlines():
+        if m := match(r"^import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)$", line):
+            total += int(m.group(1))
+            modules.add(m.group(2))
+    return total, modules
+
+
+def main():
+    parser = ArgumentParser(description="Measure package import time with python -X importtime.")
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budgets by this factor")
+    args = parser.parse_args()
+
+    results: list[dict] = []
+    failed: bool = False
+    baseline: float = median(import_time("pass")[0] for _ in range(args.repeat))
+
+    for statement, budget in budgets.items():
+        times: list[int] = []
+        modules: set[str] = set()
+        for _ in range(args.repeat):
+            t, modules = import_time(statement)
+            times.append(t)
+        loaded: list[str] = [m for m in deferred_modules if m in modules]
+        ok: bool = median(times) - baseline <= budget * args.scale and not loaded
+        failed = failed or not ok
+        results.append({"statement": statement, "median_us": median(times) - baseline,
+                        "min_us": min(times) - baseline, "budget_us": int(budget * args.scale),
+                        "deferred_loaded": loaded, "ok": ok})
+
+    print(dumps(results, indent=2))
+    sys_exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime
+from json import dumps
+from pathlib import Path
+from platform import platform
+from platform import python_version
+from random import Random
+from shutil import copy2
+from shutil import rmtree
+from sqlite3 import Connection
+from sqlite3 import connect
+from sqlite3 import sqlite_version
+from statistics import median
+from tempfile import gettempdir
+from tempfile import mkdtemp
+from time import perf_counter
+from typing import Callable
+from typing import Generator
+
+from generate import DataGenerator
+from generate import generate_database
+from generate import generate_legacy_database
+from generate import sizes
+
+from falocalrepo_database import Database
+from falocalrepo_database import __version__
+from falocalrepo_database import update
+from falocalrepo_database.tables import CommentsColumns
+from falocalrepo_database.tables import SubmissionsColumns
+
+# Benchmark name -> function returning the number of operations and the elapsed seconds
+benchmarks: dict[str, Callable[["Context"], tuple[int, float]]] = {}
+
+# Migration function -> schema of the version it upgrades from
+migrations: dict[str, Callable[[Connection], Connection]] = {
+    "update_5_0": update.make_database_5,
+    "update_5_0_10": update.make_database_5,
+    "update_5_1": update.make_database_5,
+    "update_5_1_2": update.make_database_5_1,
+    "update_5_2": update.make_database_5_1,
+    "update_5_2_2": update.make_database_5_2,
+    "update_5_3": update.make_database_5_2_2,
+    "update_5_3_4": update.make_database_5_3,
+    "update_5_4_0": update.make_database_5_3,
+}
+
+# Query, columns that use implicit wildcards
+queries: list[tuple[str, list[str]]] = [
+    ("@author user1", []),
+    ("@title wolf", ["title"]),
+    ('@tags "|fox|" & "|dragon|"', ["tags"]),
+    ("@any commission", ["any"]),
+    ("@date 2015-%", []),
+    ("@date 2015-03..2016", []),
+    ("@id 1000..2000", []),
+    ('@favorite "|user3|"', ["favorite"]),
+    ("@rating general & @type image & @category artwork%", []),
+]
+
+
+class Context:
+    def __init__(self, database: Path, work: Path, submissions: int, iterations: int, seed: int, file_size: int):
+        self.database: Path = database
+        self.work: Path = work
+        self.submissions: int = submissions
+        self.iterations: int = iterations
+        self.seed: int = seed
+        self.file_size: int = file_size
+        self.rng: Random = Random(seed)
+
+    @contextmanager
+    def open(self, *, work: bool = False) -> Generator[Database, None, None]:
+        path: Path = self.database
+        if work:
+            if not (path := self.work / self.database.name).is_file():
+                copy2(self.database, path)
+        with Database(path, check_connections=False) as db:
+            yield db
+
+    def sample_ids(self, k: int) -> list[int]:
+        return [self.rng.randint(1, self.submissions) for _ in range(k)]
+
+
+def benchmark(name: str):
+    def decorator(function: Callable[[Context], tuple[int, float]]):
+        benchmarks[name] = function
+        return function
+
+    return decorator
+
+
+@benchmark("save_submission")
+def bench_save_submission(ctx: Context) -> tuple[int, float]:
+    generator: DataGenerator = DataGenerator(ctx.submissions, ctx.seed + 1)
+    entries: list[dict] = [generator.submission_entry(ctx.submissions + n + 1) for n in range(ctx.iterations)]
+    files: list[tuple[bytes, bytes]] = [
+        (generator.file(e[SubmissionsColumns.FILEEXT.name][0], ctx.file_size), generator.file("jpg", 128))
+        for e in entries
+    ]
+    with ctx.open(work=True) as db:
+        start: float = perf_counter()
+        for entry, (file, thumbnail) in zip(entries, files):
+            db.submissions.save_submission(entry, [file], thumbnail, replace=True)
+        db.commit()
+        return len(entries), perf_counter() - start
+
+
+@benchmark("getitem")
+def bench_getitem(ctx: Context) -> tuple[int, float]:
+    ids: list[int] = ctx.sample_ids(ctx.iterations)
+    with ctx.open() as db:
+        start: float = perf_counter()
+        for id_ in ids:
+            _ = db.submissions[id_]
+        return len(ids), perf_counter() - start
+
+
+@benchmark("cursor_iteration")
+def bench_cursor_iteration(ctx: Context) -> tuple[int, float]:
+    with ctx.open() as db:
+        start: float = perf_counter()
+        rows: int = sum(1 for _ in db.submissions.select(limit=ctx.iterations * 100))
+        return rows, perf_counter() - start
+
+
+def _bench_select_query(query: str, likes: list[str]) -> Callable[[Context], tuple[int, float]]:
+    def bench(ctx: Context) -> tuple[int, float]:
+        with ctx.open() as db:
+            aliases: dict[str, str] = {"any": "AUTHOR || ' ' || TITLE || ' ' || TAGS || ' ' || DESCRIPTION"}
+            start: float = perf_counter()
+            for _ in range(n := max(ctx.iterations // 100, 1)):
+                db.submissions.select_query(query, likes=likes, aliases=aliases).fetchall()
+            return n, perf_counter() - start
+
+    return bench
+
+
+for _query, _likes in queries:
+    benchmarks[f"select_query[{_query}]"] = _bench_select_query(_query, _likes)
+
+
+@benchmark("add_favorite")
+def bench_add_favorite(ctx: Context) -> tuple[int, float]:
+    favorites: list[tuple[int, str]] = [(id_, f"user{ctx.rng.randrange(ctx.submissions // 100 or 10)}")
+                                        for id_ in ctx.sample_ids(ctx.iterations)]
+    with ctx.open(work=True) as db:
+        start: float = perf_counter()
+        for id_, user in favorites:
+            db.submissions.add_favorite(id_, user)
+        db.commit()
+        return len(favorites), perf_counter() - start
+
+
+@benchmark("get_comments_tree")
+def bench_get_comments_tree(ctx: Context) -> tuple[int, float]:
+    with ctx.open() as db:
+        parents: list[tuple[str, int]] = db.execute(
+            f"select {CommentsColumns.PARENT_TABLE.name}, {CommentsColumns.PARENT_ID.name} from {db.comments.name} "
+            f"where ROWID in ({','.join(map(str, ctx.sample_ids(ctx.iterations)))})").fetchall()
+        start: float = perf_counter()
+        for parent_table, parent_id in parents:
+            db.comments.get_comments_tree(parent_table, parent_id)
+        return len(parents), perf_counter() - start
+
+
+@benchmark("merge")
+def bench_merge(ctx: Context) -> tuple[int, float]:
+    (path := ctx.work / "merge.db").unlink(missing_ok=True)
+    with ctx.open() as db, Database(path, init=True, check_connections=False) as db_dest:
+        start: float = perf_counter()
+        db_dest.merge(db)
+        db_dest.commit()
+        return len(db_dest.users) + len(db_dest.submissions) + len(db_dest.journals), perf_counter() - start
+
+
+@benchmark("backup")
+def bench_backup(ctx: Context) -> tuple[int, float]:
+    rmtree(folder := ctx.work / "backup", ignore_errors=True)
+    with ctx.open() as db:
+        start: float = perf_counter()
+        db.backup(folder=folder)
+        return 1, perf_counter() - start
+
+
+def _bench_migration(name: str, make_database: Callable[[Connection], Connection]
+                     ) -> Callable[[Context], tuple[int, float]]:
+    def bench(ctx: Context) -> tuple[int, float]:
+        source: Path = ctx.work / f"{name}.db"
+        (destination := ctx.work / f".new_{name}.db").unlink(missing_ok=True)
+        if not source.is_file():
+            generate_legacy_database(source, make_database, ctx.submissions, seed=ctx.seed)
+            if name == "update_5_0":
+                with connect(source) as conn:
+                    conn.execute("insert or replace into SETTINGS (SETTING, SVALUE) values ('HISTORY', ?)",
+                                 [dumps([[datetime(2020, 1, 1).timestamp(), "start"]])])
+        conn: Connection = connect(source)
+        try:
+            start: float = perf_counter()
+            getattr(update, name)(conn, source, destination)
+            conn.commit()
+            return ctx.submissions, perf_counter() - start
+        finally:
+            conn.close()
+            destination.unlink(missing_ok=True)
+
+    return bench
+
+
+for _name, _make_database in migrations.items():
+    benchmarks[f"migration[{_name}]"] = _bench_migration(_name, _make_database)
+
+
+def main():
+    parser = ArgumentParser(description="Run the falocalrepo-database benchmarks and print the results as JSON.")
+    parser.add_argument("--size", choices=sizes.keys(), default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--file-size", type=int, default=1024)
+    parser.add_argument("--data", type=Path, default=Path(gettempdir()) / "falocalrepo-database-benchmarks",
+                        help="folder where generated databases are kept between runs")
+    parser.add_argument("--only", nargs="*", default=[], help="run only benchmarks starting with these names")
+    parser.add_argument("--skip", nargs="*", default=[], help="skip benchmarks starting with these names")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    database: Path = args.data / f"{args.size}-{args.seed}" / "FA.db"
+    if not database.is_file():
+        generate_database(partial := database.with_name(f".{database.name}"), sizes[args.size], seed=args.seed,
+                          file_size=args.file_size)
+        partial.replace(database)
+    with Database(database, check_connections=False) as db:
+        rows: dict[str, int] = {t.name: len(t) for t in (db.users, db.submissions, db.journals, db.comments)}
+
+    work: Path = Path(mkdtemp(prefix="falocalrepo-database-benchmarks-"))
+    results: list[dict] = []
+    try:
+        for name, function in benchmarks.items():
+            if (args.only and not any(map(name.startswith, args.only))) or any(map(name.startswith, args.skip)):
+                continue
+            ctx: Context = Context(database, work, sizes[args.size], args.iterations, args.seed, args.file_size)
+            times: list[float] = []
+            operations: int = 0
+            for _ in range(args.repeat):
+                operations, seconds = function(ctx)
+                times.append(seconds)
+            results.append({"name": name, "operations": operations, "repeat": args.repeat,
+                            "min_seconds": min(times), "median_seconds": median(times),
+                            "operations_per_second": operations / min(times) if min(times) else None})
+    finally:
+        rmtree(work, ignore_errors=True)
+
+    output: str = dumps({
+        "version": __version__,
+        "python": python_version(),
+        "sqlite": sqlite_version,
+        "platform": platform(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "size": args.size,
+        "seed": args.seed,
+        "iterations": args.iterations,
+        "rows": rows,
+        "results": results,
+    }, indent=2)
+
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
+from importlib import import_module
+
 from .__version__ import __version__
-from .column import Column
-from .database import Cursor
-from .database import Database
-from .database import HistoryTable
-from .database import JournalsTable
-from .database import SettingsTable
-from .database import SubmissionsTable
-from .database import Table
-from .database import UsersTable
+
+# Avoid importing typing at package import time, type checkers treat this name as typing.TYPE_CHECKING
+TYPE_CHECKING: bool = False
+
+if TYPE_CHECKING:
+    from . import exceptions
+    from . import tables
+    from . import util
+    from .column import Column
+    from .database import Cursor
+    from .database import Database
+    from .database import HistoryTable
+    from .database import JournalsTable
+    from .database import SearchTable
+    from .database import SettingsTable
+    from .database import SubmissionsTable
+    from .database import Table
+    from .database import Transaction
+    from .database import UsersTable
+    from .sharding import ShardedDatabase
 
 __all__ = [
     "__version__",
@@ -16,11 +29,45 @@ __all__ = [
     "Database",
     "HistoryTable",
     "JournalsTable",
+    "SearchTable",
     "SettingsTable",
     "SubmissionsTable",
     "UsersTable",
     "Table",
+    "Transaction",
+    "ShardedDatabase",
     "exceptions",
     "util",
     "tables"
 ]
+
+_lazy_attributes: dict[str, str] = {
+    "Column": ".column",
+    "Cursor": ".database",
+    "Database": ".database",
+    "HistoryTable": ".database",
+    "JournalsTable": ".database",
+    "SearchTable": ".database",
+    "SettingsTable": ".database",
+    "SubmissionsTable": ".database",
+    "UsersTable": ".database",
+    "Table": ".database",
+    "Transaction": ".database",
+    "ShardedDatabase": ".sharding",
+    "exceptions": "",
+    "util": "",
+    "tables": "",
+}
+
+
+def __getattr__(name: str):
+    if (module_name := _lazy_attributes.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = import_module(f".{name}", __name__) if not module_name else \
+        getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,223 @@
+from datetime import timedelta
+from hashlib import sha256
+from pathlib import Path
+from sqlite3 import Cursor as SQLCursor
+from types import GenericAlias
+from typing import Any
+from typing import Callable
+from typing import TYPE_CHECKING
+from typing import get_origin
+
+from .column import Column
+from .compression import is_compressed_column
+from .types import Value
+from .util import file_stamp
+
+try:
+    from numpy import arange
+    from numpy import array
+    from numpy import asarray
+    from numpy import bincount
+    from numpy import concatenate
+    from numpy import cumsum
+    from numpy import int32
+    from numpy import int64
+    from numpy import load
+    from numpy import ndarray
+    from numpy import repeat
+    from numpy import savez
+    from numpy import zeros
+    from numpy.ma import MaskedArray
+except ImportError as err:
+    raise ImportError("NumPy is required to load tables as arrays, install falocalrepo-database[arrays]") from err
+
+if TYPE_CHECKING:
+    from .database import Table
+
+__all__ = [
+    "Categorical",
+    "ListArray",
+    "Arrays",
+    "table_to_arrays",
+]
+
+_null_time: int = -(1 << 63)
+
+
+class Categorical:
+    def __init__(self, codes: ndarray, categories: ndarray):
+        self.codes: ndarray = codes
+        self.categories: ndarray = categories
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(rows={len(self.codes)}, categories={len(self.categories)})"
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def code(self, value: str) -> int:
+        return int(matches[0]) if len(matches := (self.categories == value).nonzero()[0]) else -1
+
+    def counts(self) -> ndarray:
+        return bincount(self.codes[self.codes >= 0], minlength=len(self.categories))
+
+    def values(self) -> ndarray:
+        return self.categories[self.codes]
+
+
+class ListArray:
+    def __init__(self, offsets: ndarray, values: Categorical):
+        self.offsets: ndarray = offsets
+        self.values: Categorical = values
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(rows={len(self)}, values={len(self.values)})"
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> ndarray:
+        return self.values.categories[self.values.codes[self.offsets[row]:self.offsets[row + 1]]]
+
+    def lengths(self) -> ndarray:
+        return self.offsets[1:] - self.offsets[:-1]
+
+    def rows(self) -> ndarray:
+        return repeat(arange(len(self)), self.lengths())
+
+    def contains(self, value: str) -> ndarray:
+        mask: ndarray = zeros(len(self), dtype=bool)
+        mask[self.rows()[self.values.codes == self.values.code(value)]] = True
+        return mask
+
+
+Arrays = dict[str, ndarray | MaskedArray | Categorical | ListArray]
+
+
+def _column_kind(column: Column) -> str:
+    t: type = get_origin(column.type) if type(column.type) is GenericAlias else column.type
+    if t in (list, tuple, set):
+        return "list"
+    elif column.sql_type == "datetime":
+        return "date"
+    elif column.sql_type in ("integer", "boolean", "real"):
+        return column.sql_type
+    else:
+        return "text"
+
+
+class _Builder:
+    def __init__(self, column: Column, kind: str, date_unit: timedelta | None):
+        self.column: Column = column
+        self.kind: str = kind
+        self.date_unit: timedelta | None = date_unit
+        self.chunks: list[ndarray] = []
+        self.masks: list[ndarray] = []
+        self.index: dict[str, int] = {}
+        self.lengths: list[ndarray] = []
+
+    def _codes(self, values: list[str | None]) -> ndarray:
+        index: dict[str, int] = self.index
+        return array([-1 if v is None else index.setdefault(v, len(index)) for v in values], dtype=int32)
+
+    def add(self, values: list[Value]):
+        if self.kind == "text":
+            self.chunks.append(self._codes(self.column.from_entries(values) if is_compressed_column(self.column)
+                                           else values))
+        elif self.kind == "list":
+            items: list[list[str]] = self.column.from_entries(values)
+            self.lengths.append(array([len(i) if i is not None else 0 for i in items], dtype=int64))
+            self.chunks.append(self._codes([e for i in items if i is not None for e in i]))
+        elif self.kind == "date" and self.date_unit is None:
+            self.chunks.append(array(values, dtype="datetime64[us]"))
+        elif self.kind == "date":
+            unit: str = "us" if self.date_unit < timedelta(seconds=1) else "s"
+            self.chunks.append(array([_null_time if v is None else v for v in values], dtype=int64)
+                               .astype(f"datetime64[{unit}]").astype("datetime64[us]"))
+        else:
+            mask: ndarray = array([v is None for v in values], dtype=bool)
+            self.masks.append(mask)
+            dtype: str = {"integer": "int64", "boolean": "bool", "real": "float64"}[self.kind]
+            self.chunks.append(array([0 if v is None else v for v in values], dtype=dtype))
+
+    def build(self) -> ndarray | MaskedArray | Categorical | ListArray:
+        categories: ndarray = array(list(self.index), dtype=str)
+        if self.kind == "text":
+            return Categorical(_concatenate(self.chunks, int32), categories)
+        elif self.kind == "list":
+            offsets: ndarray = concatenate([zeros(1, dtype=int64), cumsum(_concatenate(self.lengths, int64))])
+            return ListArray(offsets, Categorical(_concatenate(self.chunks, int32), categories))
+        elif self.kind == "date":
+            return _concatenate(self.chunks, "datetime64[us]")
+        elif any(m.any() for m in self.masks):
+            return MaskedArray(_concatenate(self.chunks, None), mask=_concatenate(self.masks, bool))
+        else:
+            return _concatenate(self.chunks, None)
+
+
+def _concatenate(chunks: list[ndarray], dtype: Any) -> ndarray:
+    return concatenate(chunks) if chunks else zeros(0, dtype=dtype or int64)
+
+
+def _cache_key(table: 'Table', columns: list[Column], sql: str, values: list[Value]) -> str:
+    stamp: list[tuple[int, int]] = file_stamp(table.database.path)
+    return sha256(repr((table.name, [c.name for c in columns], sql, values, stamp)).encode()).hexdigest()
+
+
+def _save(path: Path, key: str, arrays: Arrays):
+    entries: dict[str, ndarray] = {"__key__": array(key)}
+    for name, value in arrays.items():
+        if isinstance(value, Categorical):
+            entries |= {f"{name}.codes": value.codes, f"{name}.categories": value.categories}
+        elif isinstance(value, ListArray):
+            entries |= {f"{name}.offsets": value.offsets, f"{name}.codes": value.values.codes,
+                        f"{name}.categories": value.values.categories}
+        elif isinstance(value, MaskedArray):
+            entries |= {f"{name}.data": value.data, f"{name}.mask": asarray(value.mask)}
+        else:
+            entries[f"{name}.data"] = value
+    with (partial := path.with_name(f".{path.name}")).open("wb") as file:
+        savez(file, **entries)
+    partial.replace(path)
+
+
+def _load(path: Path, key: str, columns: list[Column]) -> Arrays | None:
+    if not path.is_file():
+        return None
+    with load(path) as file:
+        if "__key__" not in file or str(file["__key__"]) != key:
+            return None
+        arrays: Arrays = {}
+        for column in columns:
+            name: str = column.name
+            if f"{name}.offsets" in file:
+                arrays[name] = ListArray(file[f"{name}.offsets"],
+                                         Categorical(file[f"{name}.codes"], file[f"{name}.categories"]))
+            elif f"{name}.codes" in file:
+                arrays[name] = Categorical(file[f"{name}.codes"], file[f"{name}.categories"])
+            elif f"{name}.mask" in file:
+                arrays[name] = MaskedArray(file[f"{name}.data"], mask=file[f"{name}.mask"])
+            else:
+                arrays[name] = file[f"{name}.data"]
+        return arrays
+
+
+def table_to_arrays(table: 'Table', cursor: SQLCursor, columns: list[Column], sql: str, values: list[Value], *,
+                    chunk_size: int = 10000, cache: Path = None) -> Arrays:
+    key: str | None = None
+    if cache is not None and table.database.is_clean:
+        key = _cache_key(table, columns, sql, values)
+        if (arrays := _load(cache, key, columns)) is not None:
+            cursor.close()
+            return arrays
+
+    builders: list[_Builder] = [_Builder(c, _column_kind(c), table.date_unit) for c in columns]
+    add: list[Callable[[list[Value]], None]] = [b.add for b in builders]
+    while rows := cursor.fetchmany(chunk_size):
+        for add_chunk, column_values in zip(add, zip(*rows)):
+            add_chunk(list(column_values))
+
+    arrays = {b.column.name: b.build() for b in builders}
+    if key is not None:
+        _save(cache, key, arrays)
+    return arrays
@@ -0,0 +1,285 @@
+from csv import DictReader
+from datetime import datetime
+from datetime import timedelta
+from json import dumps
+from json import loads
+from pathlib import Path
+from queue import Queue
+from sqlite3 import Connection
+from sqlite3 import IntegrityError
+from threading import Event
+from threading import Thread
+from time import perf_counter
+from typing import Any
+from typing import Generator
+from typing import TYPE_CHECKING
+
+from .column import Column
+from .column import Encoder
+from .column import NoDefault
+from .column import epoch
+from .compression import is_compressed_column
+from .export import FORMAT_COLUMNAR
+from .export import FORMAT_CSV
+from .export import FORMAT_JSONL
+from .export import guess_format
+from .export import is_list_column
+from .export import read_columnar
+from .tables import epoch_date_columns
+from .types import Value
+
+if TYPE_CHECKING:
+    from .database import Database
+    from .database import Table
+
+__all__ = [
+    "ImportStats",
+    "bulk_import",
+    "import_state_setting",
+]
+
+_end: object = object()
+
+_relaxed_pragmas: dict[str, Any] = {
+    "synchronous": 0,
+    "temp_store": 2,
+    "cache_size": -262144,
+}
+
+
+class ImportStats:
+    def __init__(self, source: Path, table: str, rows: int, invalid: list[tuple[int, str]], resumed_from: int,
+                 seconds: float):
+        self.source: Path = source
+        self.table: str = table
+        self.rows: int = rows
+        self.invalid: list[tuple[int, str]] = invalid
+        self.resumed_from: int = resumed_from
+        self.seconds: float = seconds
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}({str(self.source)!r}, table={self.table!r}, rows={self.rows}, "
+                f"invalid={len(self.invalid)}, resumed_from={self.resumed_from}, seconds={self.seconds:.3f})")
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+
+def import_state_setting(table: str) -> str:
+    return f"BULKIMPORT:{table.upper()}"
+
+
+def _read_records(source: Path, format_: str) -> Generator[dict[str, Any], None, None]:
+    if format_ == FORMAT_JSONL:
+        with source.open("r", encoding="utf-8") as file:
+            yield from (loads(line) for line in file if line.strip())
+    elif format_ == FORMAT_CSV:
+        with source.open("r", encoding="utf-8", newline="") as file:
+            yield from DictReader(file)
+    elif format_ == FORMAT_COLUMNAR:
+        for chunk in read_columnar(source):
+            yield from (dict(zip(chunk.keys(), row)) for row in zip(*chunk.values()))
+    else:
+        raise ValueError(f"Unknown import format {format_!r}")
+
+
+def _parse_source(source: Path, format_: str, offset: int, batch_size: int, batches: Queue, stop: Event):
+    try:
+        batch: list[dict[str, Any]] = []
+        for n, record in enumerate(_read_records(source, format_)):
+            if n < offset:
+                continue
+            batch.append({k.upper(): v for k, v in record.items()})
+            if len(batch) >= batch_size:
+                batches.put(batch)
+                batch = []
+            if stop.is_set():
+                return
+        if batch:
+            batches.put(batch)
+        batches.put(_end)
+    except BaseException as err:
+        batches.put(err)
+
+
+# Integer dates are offsets from the epoch in the unit used by the table when it stores epoch dates, they are
+# converted to the storage format of the table like ISO 8601 dates
+def _encode_column(column: Column, values: list[Any], invalid: dict[int, str], epoch_unit: timedelta | None
+                   ) -> list[Value]:
+    encoded: list[Value] = []
+    list_column: bool = is_list_column(column)
+    integer_column: bool = column.sql_type in ("integer", "boolean")
+    date_column: bool = column.sql_type == "datetime"
+    compressed: bool = is_compressed_column(column)
+    for n, value in enumerate(values):
+        try:
+            if value is NoDefault:
+                raise ValueError("missing value")
+            elif value == "" and not column.not_null and not list_column:
+                value = None
+            elif isinstance(value, (list, tuple, set, dict, datetime)):
+                value = column.to_entry(value)
+            elif compressed and isinstance(value, str):
+                value = column.to_entry(value)
+            elif date_column and isinstance(value, str) and not value.lstrip("-").isdigit():
+                value = column.to_entry(datetime.fromisoformat(value))
+            elif date_column and value is not None:
+                if epoch_unit is None or not isinstance(value, (int, str)) or isinstance(value, bool):
+                    raise TypeError(f"expected date, got {type(value).__name__}")
+                value = column.to_entry(epoch + epoch_unit * int(value))
+            elif list_column and value is not None and not isinstance(value, str):
+                raise TypeError(f"expected list, got {type(value).__name__}")
+            elif integer_column and isinstance(value, str):
+                value = int(value) if value.lower() not in ("true", "false") else int(value.lower() == "true")
+            elif column.sql_type == "real" and isinstance(value, str):
+                value = float(value)
+            if value is None and column.not_null:
+                raise ValueError("null value")
+        except (TypeError, ValueError, AttributeError) as err:
+            invalid.setdefault(n, f"{column.name}: {err}")
+            value = None
+        encoded.append(value)
+    return encoded
+
+
+# Encoded rows are checked against the NOT NULL and CHECK constraints of the columns, so that rows that would be
+# dropped or rejected by the database are reported before inserting
+def _encode_batch(columns: list[Column], encoder: Encoder, batch: list[dict[str, Any]], epoch_unit: timedelta | None
+                  ) -> tuple[list[tuple], list[int], dict[int, str]]:
+    invalid: dict[int, str] = {}
+    encoded_columns: list[list[Value]] = [
+        _encode_column(c, [r.get(c.name, c.default) for r in batch], invalid, epoch_unit)
+        for c in columns
+    ]
+    names: list[str] = [c.name for c in columns]
+    valid: list[tuple[int, tuple]] = []
+    for n, row in enumerate(zip(*encoded_columns)):
+        if n in invalid:
+            continue
+        try:
+            encoder.validate(dict(zip(names, row)))
+            valid.append((n, row))
+        except IntegrityError as err:
+            invalid[n] = str(err)
+    return [row for _, row in valid], [n for n, _ in valid], invalid
+
+
+def _secondary_indexes(connection: Connection, table: str) -> list[str]:
+    return [sql for [sql] in connection.execute(
+        "select sql from sqlite_master where type = 'index' and tbl_name = ? and sql is not null", [table])]
+
+
+def _drop_indexes(connection: Connection, table: str):
+    for [name] in connection.execute(
+            "select name from sqlite_master where type = 'index' and tbl_name = ? and sql is not null",
+            [table]).fetchall():
+        connection.execute(f"drop index if exists {name}")
+
+
+# Rows that fail or are ignored are reported by their position in the source, positions holds the source index of
+# each row. The batch is inserted again row by row when any row was not inserted to find which ones.
+def _insert_batch(connection: Connection, sql: str, rows: list[tuple], positions: list[int],
+                  invalid: list[tuple[int, str]]) -> int:
+    if not rows:
+        return 0
+    connection.execute("savepoint bulk_import")
+    try:
+        if (inserted := connection.executemany(sql, rows).rowcount) == len(rows):
+            connection.execute("release savepoint bulk_import")
+            return inserted
+    except IntegrityError:
+        pass
+    connection.execute("rollback to savepoint bulk_import")
+    connection.execute("release savepoint bulk_import")
+
+    inserted = 0
+    for n, row in enumerate(rows):
+        try:
+            if connection.execute(sql, row).rowcount > 0:
+                inserted += 1
+            else:
+                invalid.append((positions[n], "row ignored: it conflicts with an existing row"))
+        except IntegrityError as err:
+            invalid.append((positions[n], str(err)))
+    return inserted
+
+
+def bulk_import(database: 'Database', source: str | Path, table: 'Table', *, format_: str = None,
+                batch_size: int = 5000, replace: bool = False, exist_ok: bool = False, resume: bool = True,
+                drop_indexes: bool = True) -> ImportStats:
+    source = Path(source)
+    format_ = format_ or guess_format(source)
+    connection: Connection = database.connection
+    columns: list[Column] = table.columns
+    setting: str = import_state_setting(table.name)
+    epoch_unit: timedelta | None = epoch_date_columns[table.name][1] if table.name in epoch_date_columns else None
+    source_id: dict[str, Any] = {"source": str(source.resolve()), "size": (st := source.stat()).st_size,
+                                 "mtime": st.st_mtime_ns}
+
+    state: dict[str, Any] = loads(database.settings[setting] or "{}")
+    if not resume or {k: state.get(k) for k in source_id} != source_id:
+        indexes: list[str] = state.get("indexes", []) + _secondary_indexes(connection, table.name)
+        state = source_id | {"rows": 0, "indexes": indexes}
+
+    database.commit()
+    pragmas: dict[str, Any] = {p: connection.execute(f"pragma {p}").fetchone()[0] for p in _relaxed_pragmas}
+    for pragma, value in _relaxed_pragmas.items():
+        connection.execute(f"pragma {pragma} = {value}")
+
+    sql: str = (f"INSERT {'OR REPLACE' if replace else 'OR IGNORE' if exist_ok else ''} INTO {table.name} "
+                f"({','.join(c.name for c in columns)}) VALUES ({','.join(['?'] * len(columns))})")
+    batches: Queue = Queue(maxsize=4)
+    stop: Event = Event()
+    parser: Thread = Thread(target=_parse_source, args=(source, format_, state["rows"], batch_size, batches, stop),
+                            daemon=True)
+    resumed_from: int = state["rows"]
+    invalid: list[tuple[int, str]] = []
+    inserted: int = 0
+    start: float = perf_counter()
+
+    try:
+        if drop_indexes:
+            _drop_indexes(connection, table.name)
+        database.settings[setting] = dumps(state)
+        database.commit()
+
+        parser.start()
+        while (batch := batches.get()) is not _end:
+            if isinstance(batch, BaseException):
+                raise batch
+            rows, positions, batch_invalid = _encode_batch(columns, table.encoder, batch, epoch_unit)
+            invalid.extend((state["rows"] + n, err) for n, err in sorted(batch_invalid.items()))
+            if not connection.in_transaction:
+                connection.execute("begin")
+            inserted += _insert_batch(connection, sql, rows, [state["rows"] + n for n in positions], invalid)
+            state["rows"] += len(batch)
+            database.settings[setting] = dumps(state)
+            database.commit()
+
+        existing_indexes: list[str] = _secondary_indexes(connection, table.name)
+        for index in state["indexes"]:
+            if index not in existing_indexes:
+                connection.execute(index)
+        database.commit()
+        if table.search is not None and table.search.is_enabled:
+            table.search.populate(batch_size)
+        del database.settings[setting]
+        database.commit()
+    finally:
+        stop.set()
+        while parser.is_alive():
+            if not batches.empty():
+                batches.get_nowait()
+            parser.join(.01)
+        if connection.in_transaction:
+            connection.rollback()
+        for pragma, value in pragmas.items():
+            connection.execute(f"pragma {pragma} = {value}")
+        # Rows are inserted without going through the table, so its key filter is built again
+        # noinspection PyProtectedMember
+        if table._key_filter is not None:
+            table.key_filter(rebuild=True)
+
+    return ImportStats(source, table.name, inserted, sorted(invalid), resumed_from, perf_counter() - start)
+
@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from itertools import islice
+from sqlite3 import Cursor as SQLCursor
+from sys import getsizeof
+from threading import Lock
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import Sequence
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__ = [
+    "CachedCursor",
+    "RecordingCursor",
+    "QueryCache",
+]
+
+
+class CachedCursor:
+    arraysize: int = 1
+
+    def __init__(self, rows: list[tuple]):
+        self.rows: Iterator[tuple] = iter(rows)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self
+
+    def __next__(self) -> tuple:
+        return next(self.rows)
+
+    def fetchone(self) -> tuple | None:
+        return next(self.rows, None)
+
+    def fetchmany(self, size: int = None) -> list[tuple]:
+        return list(islice(self.rows, self.arraysize if size is None else size))
+
+    def fetchall(self) -> list[tuple]:
+        return list(self.rows)
+
+    def close(self):
+        self.rows = iter(())
+
+
+# Rows of a cache miss are read from the database cursor as they are fetched and a copy is kept until the cursor is
+# exhausted, when they are stored, or until they are larger than a cache entry can be, when the copy is dropped
+class RecordingCursor:
+    def __init__(self, cursor: SQLCursor, rows: list[tuple], store: Callable[[list[tuple], int], None],
+                 max_size: int):
+        self.cursor: SQLCursor = cursor
+        self.pending: Iterator[tuple] = iter(rows)
+        self.recorded: list[tuple] | None = list(rows)
+        self.size: int = _rows_size(rows)
+        self.store: Callable[[list[tuple], int], None] = store
+        self.max_size: int = max_size
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self
+
+    def __next__(self) -> tuple:
+        if (row := next(self.pending, None)) is not None:
+            return row
+        try:
+            row = next(self.cursor)
+        except StopIteration:
+            self._record([], True)
+            raise
+        self._record([row], False)
+        return row
+
+    @property
+    def arraysize(self) -> int:
+        return self.cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, value: int):
+        self.cursor.arraysize = value
+
+    def _record(self, rows: list[tuple], done: bool):
+        if self.recorded is None:
+            return
+        self.recorded.extend(rows)
+        if (size := self.size + sum(map(_row_size, rows))) > self.max_size:
+            self.recorded = None
+        elif done:
+            self.store(self.recorded, size)
+            self.recorded = None
+        self.size = size
+
+    def _read(self, size: int | None) -> list[tuple]:
+        rows: list[tuple] = list(islice(self.pending, size))
+        if size is None or len(rows) < size:
+            fetched: list[tuple] = self.cursor.fetchall() if size is None else self.cursor.fetchmany(size - len(rows))
+            self._record(fetched, size is None or len(rows) + len(fetched) < size)
+            rows.extend(fetched)
+        return rows
+
+    def fetchone(self) -> tuple | None:
+        return rows[0] if (rows := self._read(1)) else None
+
+    def fetchmany(self, size: int = None) -> list[tuple]:
+        return self._read(self.arraysize if size is None else size)
+
+    def fetchall(self) -> list[tuple]:
+        return self._read(None)
+
+    def close(self):
+        self.pending = iter(())
+        self.recorded = None
+        self.cursor.close()
+
+
+def _row_size(row: tuple) -> int:
+    return getsizeof(row) + sum(map(getsizeof, row))
+
+
+def _rows_size(rows: list[tuple]) -> int:
+    return getsizeof(rows) + sum(map(_row_size, rows))
+
+
+# Results are stored as raw rows and cleared whenever PRAGMA data_version or the connection's total changes differ
+# from the ones they were read with, so writes from this and other connections are both detected
+class QueryCache:
+    prefetch_rows: int = 64
+
+    def __init__(self, database: 'Database'):
+        self.database: 'Database' = database
+        self.enabled: bool = False
+        self.max_entries: int = 1024
+        self.max_bytes: int = 64 << 20
+        self.max_entry_bytes: int = 4 << 20
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.size: int = 0
+        self._entries: OrderedDict[tuple[str, tuple], tuple[list[tuple], int]] = OrderedDict()
+        self._version: tuple[int, int] | None = None
+        self._lock: Lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def data_version(self) -> tuple[int, int]:
+        return self.database.connection.execute("pragma data_version").fetchone()[0], self.database.total_changes
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / total if (total := self.hits + self.misses) else 0.
+
+    @property
+    def metrics(self) -> dict[str, int | float]:
+        return {"entries": len(self), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hit_rate}
+
+    def enable(self, *, max_entries: int = 1024, max_bytes: int = 64 << 20, max_entry_bytes: int = None):
+        self.enabled = True
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_bytes, max_entry_bytes or max_bytes // 16)
+        with self._lock:
+            self._evict()
+
+    def disable(self):
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self.size = 0
+
+    def reset_metrics(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def execute(self, sql: str, parameters: Sequence[Any] = None) -> CachedCursor | RecordingCursor:
+        key: tuple[str, tuple] = (sql, tuple(parameters or ()))
+        version: tuple[int, int] = self.data_version
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                self.size = 0
+            if (entry := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return CachedCursor(entry[0])
+            self.misses += 1
+
+        cursor: SQLCursor = self.database.execute(sql, parameters)
+        rows: list[tuple] = cursor.fetchmany(self.prefetch_rows)
+        if len(rows) < self.prefetch_rows:
+            self._store(key, version, rows, _rows_size(rows))
+            return CachedCursor(rows)
+        return RecordingCursor(cursor, rows, lambda rows_, size: self._store(key, version, rows_, size),
+                               self.max_entry_bytes)
+
+    # Results are only stored if the database has not changed since they were read
+    def _store(self, key: tuple[str, tuple], version: tuple[int, int], rows: list[tuple], size: int):
+        if size > self.max_entry_bytes or self.data_version != version:
+            return
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (rows, size)
+                self.size += size
+                self._evict()
@@ -1,11 +1,21 @@
 from datetime import datetime
-from json import dumps
-from json import loads
+from datetime import timedelta
+from functools import lru_cache
+from operator import eq
+from operator import ge
+from operator import gt
+from operator import le
+from operator import lt
+from operator import ne
+from re import Pattern
+from re import compile as re_compile
+from sqlite3 import IntegrityError
 from types import GenericAlias
 from typing import Any
 from typing import Callable
 from typing import Optional
 from typing import Protocol
+from typing import Sequence
 from typing import Type
 from typing import TypeVar
 from typing import Union
@@ -18,6 +28,7 @@ T = TypeVar("T")
 NoDefault = TypeVar("NoDefault")
 
 date_format: str = "%Y-%m-%dT%H:%M"
+epoch: datetime = datetime(1970, 1, 1)
 
 
 def format_list(obj: list[Value], *, sort: bool = False) -> str:
@@ -47,6 +58,8 @@ def type_to_sql(t: type) -> str:
         return "boolean"
     elif t_ is datetime:
         return "datetime"
+    elif t_ is bytes:
+        return "blob"
     elif t_ in (list, tuple, set, dict):
         return "text"
     else:
@@ -66,6 +79,8 @@ def sql_to_type(t: str | Type[Any]) -> Type[T]:
         return datetime
     elif t == "text":
         return str
+    elif t == "blob":
+        return bytes
     else:
         raise TypeError(f"unknown SQLite type {t!r}")
 
@@ -73,7 +88,7 @@ def sql_to_type(t: str | Type[Any]) -> Type[T]:
 def default_formatter(t: Type[T]) -> Callable[[T], Value]:
     t_: type = get_origin(t) if type(t) is GenericAlias else t
 
-    if t_ in (Any, int, float, str, bool):
+    if t_ in (Any, int, float, str, bool, bytes):
         return lambda v: v
     elif t_ is datetime:
         return lambda v: v.strftime(date_format) if v is not None else None
@@ -82,6 +97,7 @@ def default_formatter(t: Type[T]) -> Callable[[T], Value]:
     elif t_ is set:
         return lambda v: format_list(v, sort=True) if v is not None else None
     elif t_ is dict:
+        from json import dumps
         return lambda v: dumps(v) if v is not None else None
     else:
         raise TypeError(t, "not allowed")
@@ -97,19 +113,183 @@ def default_parser(t: Type[T]) -> Callable[[Value], T]:
 
     if t_ is Any:
         return lambda v: v
-    elif t_ in (int, float, str, bool):
+    elif t_ in (int, float, str, bool, bytes):
         return lambda v: t_(v) if v is not None else None
     elif t_ is datetime:
-        return lambda v: datetime.strptime(v, date_format) if v is not None else None
+        return lambda v: datetime.fromisoformat(v) if v is not None else None
     elif t_ in (list, tuple, set):
         return (lambda v: t_(map(sub_type, parse_list_filter_empty(v))) if v is not None else None) if sub_type else (
             lambda v: t_(parse_list_filter_empty(v)) if v is not None else None)
     elif t_ is dict:
+        from json import loads
         return lambda v: loads(v) if v is not None else None
     else:
         raise TypeError(t, "not allowed")
 
 
+def _cached_parser(parser: Callable[[Value], T]) -> Callable[[Sequence[Value]], list[T]]:
+    def parse(values: Sequence[Value]) -> list[T]:
+        parsed: dict[Value, T] = {v: parser(v) for v in set(values) if v is not None}
+        return list(map(parsed.get, values))
+
+    return parse
+
+
+# Whole columns are converted with one call, dates are parsed once per distinct value
+def default_batch_parser(t: Type[T], parser: Callable[[Value], T] = None) -> Callable[[Sequence[Value]], list[T]]:
+    sub_type: Optional[type] = None
+    t_: type = t
+
+    if type(t) is GenericAlias:
+        t_ = get_origin(t)
+        sub_type = get_args(t)[0]
+
+    if t_ is datetime:
+        return _cached_parser(parser or datetime.fromisoformat)
+    elif parser is not None:
+        return lambda vs: list(map(parser, vs))
+    elif t_ is Any:
+        return list
+    elif t_ in (int, float, str, bool, bytes):
+        return lambda vs: [v if v is None or type(v) is t_ else t_(v) for v in vs]
+    elif t_ in (list, tuple, set) and sub_type:
+        return lambda vs: [t_(map(sub_type, filter(None, v.removeprefix("|").removesuffix("|").split("||"))))
+                           if v is not None else None for v in vs]
+    elif t_ in (list, tuple, set):
+        return lambda vs: [t_(filter(None, v.removeprefix("|").removesuffix("|").split("||")))
+                           if v is not None else None for v in vs]
+    else:
+        return lambda vs: list(map(default_parser(t), vs))
+
+
+# Naive datetimes are stored as a whole number of units since the epoch without any timezone conversion, so that the
+# stored values match the wall-clock times of the text format
+def epoch_formatter(unit: timedelta) -> Callable[[datetime], int]:
+    return lambda v: (v.replace(tzinfo=None) - epoch) // unit if v is not None else None
+
+
+def epoch_parser(unit: timedelta) -> Callable[[int], datetime]:
+    return lambda v: epoch + unit * v if v is not None else None
+
+
+_check_token: Pattern = re_compile(r"\s*(?:(-?\d+(?:\.\d+)?)|'((?:[^']|'')*)'|(==|!=|<>|<=|>=|[=<>(),])|(\{name}|\w+))")
+_check_operators: dict[str, Callable[[Any, Any], bool]] = {
+    "=": eq, "==": eq, "!=": ne, "<>": ne, "<": lt, "<=": le, ">": gt, ">=": ge,
+}
+
+
+def _check_tokens(check: str) -> list[tuple[str, Any]]:
+    tokens: list[tuple[str, Any]] = []
+    position: int = 0
+    while position < len(check.rstrip()):
+        if (m := _check_token.match(check, position)) is None:
+            raise ValueError(f"Unsupported CHECK expression {check!r}")
+        position = m.end()
+        number, string, symbol, word = m.groups()
+        if number is not None:
+            tokens.append(("value", float(number) if "." in number else int(number)))
+        elif string is not None:
+            tokens.append(("value", string.replace("''", "'")))
+        elif symbol is not None:
+            tokens.append(("symbol", symbol))
+        else:
+            tokens.append(("name", word) if word == "{name}" else ("word", word.lower()))
+    return tokens
+
+
+# Recursive descent parser for the CHECK grammar used by the tables: or/and of parenthesized conditions, comparisons,
+# in lists of literals, and null tests, with the column, literals, and length(...) as operands
+class _CheckParser:
+    def __init__(self, tokens: list[tuple[str, Any]]):
+        self.tokens: list[tuple[str, Any]] = tokens
+        self.position: int = 0
+
+    def peek(self) -> tuple[str, Any] | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, *expected: tuple[str, Any]) -> tuple[str, Any]:
+        if (token := self.peek()) is None or (expected and token not in expected):
+            raise ValueError(f"Unexpected token {token!r} in CHECK expression")
+        self.position += 1
+        return token
+
+    def parse(self) -> Callable[[Value], bool]:
+        function: Callable[[Value], bool] = self.disjunction()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected token {self.peek()!r} in CHECK expression")
+        return function
+
+    def disjunction(self) -> Callable[[Value], bool]:
+        terms: list[Callable[[Value], bool]] = [self.conjunction()]
+        while self.peek() == ("word", "or"):
+            self.take()
+            terms.append(self.conjunction())
+        return terms[0] if len(terms) == 1 else lambda v: any(term(v) for term in terms)
+
+    def conjunction(self) -> Callable[[Value], bool]:
+        terms: list[Callable[[Value], bool]] = [self.condition()]
+        while self.peek() == ("word", "and"):
+            self.take()
+            terms.append(self.condition())
+        return terms[0] if len(terms) == 1 else lambda v: all(term(v) for term in terms)
+
+    def condition(self) -> Callable[[Value], bool]:
+        if self.peek() == ("symbol", "("):
+            self.take()
+            function: Callable[[Value], bool] = self.disjunction()
+            self.take(("symbol", ")"))
+            return function
+
+        left: Callable[[Value], Any] = self.operand()
+        kind, operator = self.take()
+        if (kind, operator) == ("word", "is"):
+            negate: bool = self.peek() == ("word", "not") and bool(self.take())
+            self.take(("word", "null"))
+            return (lambda v: left(v) is not None) if negate else (lambda v: left(v) is None)
+        elif (kind, operator) == ("word", "in"):
+            self.take(("symbol", "("))
+            values: list[Any] = []
+            while True:
+                if (token := self.take())[0] != "value":
+                    raise ValueError(f"Unexpected token {token!r} in CHECK expression")
+                values.append(token[1])
+                if self.take(("symbol", ","), ("symbol", ")")) == ("symbol", ")"):
+                    break
+            options: frozenset = frozenset(values)
+            return lambda v: left(v) in options
+        elif kind != "symbol" or operator not in _check_operators:
+            raise ValueError(f"Unexpected token {(kind, operator)!r} in CHECK expression")
+        elif self.peek() == ("word", "null") and operator in ("=", "==", "!=", "<>"):
+            self.take()
+            return (lambda v: left(v) is None) if operator in ("=", "==") else (lambda v: left(v) is not None)
+
+        right: Callable[[Value], Any] = self.operand()
+        compare: Callable[[Any, Any], bool] = _check_operators[operator]
+        return lambda v: compare(left(v), right(v))
+
+    def operand(self) -> Callable[[Value], Any]:
+        kind, value = self.take()
+        if kind == "name":
+            return lambda v: v
+        elif kind == "value":
+            return lambda _: value
+        elif (kind, value) == ("word", "length"):
+            self.take(("symbol", "("))
+            inner: Callable[[Value], Any] = self.operand()
+            self.take(("symbol", ")"))
+            return lambda v: len(inner(v))
+        raise ValueError(f"Unexpected token {(kind, value)!r} in CHECK expression")
+
+
+# Translates the simple CHECK expressions used by the tables to a Python function of the column value without
+# evaluating any code, expressions that cannot be parsed are left to SQLite
+def compile_check(check: str) -> Callable[[Value], bool] | None:
+    try:
+        return _CheckParser(_check_tokens(check)).parse()
+    except ValueError:
+        return None
+
+
 class _Column(Protocol[T]):
     name: str
     type: Type[T]
@@ -133,17 +313,60 @@ class Column(_Column):
         self.unique: bool = unique
         self.key: bool = key
         self._check: str = check
-        self.to_entry: Callable[[T], Value] = to_entry if to_entry is not None else default_formatter(self.type)
-        self.from_entry: Callable[[Value], T] = from_entry if from_entry is not None else default_parser(self.type)
+        self._to_entry: Callable[[T], Value] | None = to_entry
+        self._from_entry: Callable[[Value], T] | None = from_entry
+        self._validator: Callable[[Value], bool] | None | Type[NoDefault] = NoDefault
+        self._from_entries: Callable[[Sequence[Value]], list[T]] | None = None
+        self._custom_from_entry: Callable[[Value], T] | None = from_entry
         self.default: Union[T, None, Type[NoDefault]] = default
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.name!r}, {self.type})"
 
+    @property
+    def to_entry(self) -> Callable[[T], Value]:
+        if self._to_entry is None:
+            self._to_entry = default_formatter(self.type)
+        return self._to_entry
+
+    @property
+    def from_entry(self) -> Callable[[Value], T]:
+        if self._from_entry is None:
+            self._from_entry = default_parser(self.type)
+        return self._from_entry
+
     @property
     def check(self) -> str:
         return self._check.format(name=self.name) if self._check else ""
 
+    def to_entries(self, values: Sequence[T]) -> list[Value]:
+        return list(map(self.to_entry, values))
+
+    def from_entries(self, values: Sequence[Value]) -> list[T]:
+        if self._from_entries is None:
+            self._from_entries = default_batch_parser(self.type, self._custom_from_entry)
+        return self._from_entries(values)
+
+    @property
+    def validator(self) -> Callable[[Value], bool] | None:
+        if self._validator is NoDefault:
+            self._validator = compile_check(self._check) if self._check else None
+        return self._validator
+
+    # Values are checked like SQLite does: null values pass the CHECK constraint, and comparisons between different
+    # types are left to the database
+    def validate(self, value: Value):
+        if value is None:
+            if self.not_null and not (self.key and self.sql_type == "integer"):
+                raise IntegrityError(f"NOT NULL constraint failed: {self.name}")
+            return
+        try:
+            valid: bool = (validator := self.validator) is None or validator(value)
+        except TypeError:
+            return
+        if not valid:
+            raise IntegrityError(f"CHECK constraint failed: {self.check}")
+
     def create_statement(self) -> str:
         elements: list[str] = [self.name, self.sql_type]
         if self.unique:
@@ -154,3 +377,48 @@ class Column(_Column):
             elements.append(f"check ({self.check})")
 
         return " ".join(elements)
+
+
+class Encoder:
+    def __init__(self, columns: tuple[Column, ...]):
+        self.columns: tuple[Column, ...] = columns
+        self.names: dict[str, Column] = {c.name.lower(): c for c in columns}
+        self.defaults: dict[str, Value] = {c.name: c.to_entry(c.default) for c in columns
+                                           if c.default is not NoDefault}
+        self._formatters: dict[str, tuple[str, Callable[[Any], Value]]] = {
+            k: (c.name, c.to_entry) for c in columns for k in (c.name, c.name.lower(), c.name.upper())
+        }
+        self._validators: dict[str, Callable[[Value], None]] = {c.name: c.validate for c in columns
+                                                                if c.check or c.not_null}
+
+    def _column(self, name: str) -> tuple[str, Callable[[Any], Value]]:
+        if (formatter := self._formatters.get(name)) is None and \
+                (formatter := self._formatters.get(name.lower())) is None:
+            raise KeyError(f"Unknown column {name!r}")
+        return formatter
+
+    def validate(self, entry: dict[str, Value]):
+        for name, value in entry.items():
+            if (validate := self._validators.get(name)) is not None:
+                validate(value)
+
+    def encode(self, entry: dict[str, Any], *, defaults: bool = True, validate: bool = None) -> dict[str, Value]:
+        encoded: dict[str, Value] = dict(self.defaults) if defaults else {}
+        for key, value in entry.items():
+            name, to_entry = self._column(key)
+            encoded[name] = to_entry(value)
+        if (defaults if validate is None else validate):
+            self.validate(encoded)
+        return encoded
+
+    def encode_tuple(self, entry: dict[str, Any], *, validate: bool = True) -> tuple[Value, ...]:
+        encoded: dict[str, Value] = self.encode(entry, validate=False)
+        encoded = {c.name: encoded.get(c.name) for c in self.columns}
+        if validate:
+            self.validate(encoded)
+        return tuple(encoded.values())
+
+
+@lru_cache(maxsize=128)
+def get_encoder(columns: tuple[Column, ...]) -> Encoder:
+    return Encoder(columns)
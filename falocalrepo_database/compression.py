@@ -0,0 +1,81 @@
+from collections import Counter
+from re import Pattern
+from re import compile as re_compile
+from typing import Iterable
+from zlib import DEFLATED
+from zlib import MAX_WBITS
+from zlib import compressobj
+from zlib import decompressobj
+
+from .column import Column
+from .types import Value
+
+__all__ = [
+    "TextCompressor",
+    "CompressedColumn",
+    "is_compressed_column",
+    "train_dictionary",
+]
+
+_format_zlib: bytes = b"\x01"
+_tokens: Pattern = re_compile(r"<[^>]*>|[^<\s]+\s*")
+_max_dictionary_size: int = 1 << 15
+
+
+# Frequent tags and words are placed at the end of the dictionary, where deflate can reference them with the shortest
+# distances
+def train_dictionary(samples: Iterable[str], size: int = _max_dictionary_size) -> bytes:
+    counts: Counter[str] = Counter()
+    for sample in samples:
+        counts.update(_tokens.findall(sample))
+    selected: list[bytes] = []
+    total: int = 0
+    for token, count in sorted(counts.items(), key=lambda tc: tc[1] * len(tc[0]), reverse=True):
+        if total >= size:
+            break
+        elif count < 2:
+            continue
+        selected.append(encoded := token.encode())
+        total += len(encoded)
+    return b"".join(reversed(selected))[-size:]
+
+
+# Values are stored as raw deflate streams with a preset dictionary, prefixed by a format byte; short values and values
+# that do not shrink are kept as text, so compressed and plain rows can be mixed in the same column
+class TextCompressor:
+    def __init__(self, dictionary: bytes, *, level: int = 6, min_size: int = 64):
+        self.dictionary: bytes = dictionary[-_max_dictionary_size:]
+        self.level: int = level
+        self.min_size: int = min_size
+
+    def compress(self, value: str | None) -> str | bytes | None:
+        if value is None or len(value) < self.min_size:
+            return value
+        compressor = compressobj(self.level, DEFLATED, -MAX_WBITS, zdict=self.dictionary) if self.dictionary else \
+            compressobj(self.level, DEFLATED, -MAX_WBITS)
+        text: bytes = value.encode()
+        data: bytes = _format_zlib + compressor.compress(text) + compressor.flush()
+        return data if len(data) < len(text) else value
+
+    def decompress(self, value: Value) -> Value:
+        if not isinstance(value, bytes) or not value.startswith(_format_zlib):
+            return value
+        decompressor = decompressobj(-MAX_WBITS, zdict=self.dictionary) if self.dictionary else \
+            decompressobj(-MAX_WBITS)
+        return (decompressor.decompress(value[1:]) + decompressor.flush()).decode()
+
+
+class CompressedColumn(Column):
+    def __init__(self, column: Column, compressor: TextCompressor):
+        to_entry, from_entry = column._to_entry, column._custom_from_entry
+        super().__init__(column.name, column.type, column.sql_type, column.not_null, column.unique, column.key,
+                         column._check, column.default,
+                         compressor.compress if to_entry is None else lambda v: compressor.compress(to_entry(v)),
+                         compressor.decompress if from_entry is None else
+                         lambda v: from_entry(compressor.decompress(v)))
+        self.column: Column = column
+        self.compressor: TextCompressor = compressor
+
+
+def is_compressed_column(column: Column) -> bool:
+    return isinstance(column, CompressedColumn)
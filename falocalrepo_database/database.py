@@ -1,4 +1,7 @@
+from collections import Counter
 from datetime import datetime
+from datetime import timedelta
+from itertools import islice
 from os import PathLike
 from pathlib import Path
 from re import search
@@ -8,49 +11,97 @@ from shutil import move
 from sqlite3 import Connection
 from sqlite3 import Cursor as SQLCursor
 from sqlite3 import DatabaseError
+from sqlite3 import OperationalError
 from sqlite3 import ProgrammingError
 from sqlite3 import connect
+from time import monotonic
 from typing import Any
+from typing import Callable
 from typing import Generator
 from typing import Iterable
+from typing import TYPE_CHECKING
 from typing import Type
 from typing import TypeVar
 from typing import overload
-
-from psutil import Process
+from urllib.parse import urlencode
 
 from .__version__ import __version__
+from .cache import QueryCache
 from .column import Column
-from .column import NoDefault
+from .column import Encoder
+from .column import get_encoder
+from .column import epoch_formatter
+from .column import epoch_parser
 from .exceptions import VersionError
+from .instrumentation import Instrumentation
+from .maintenance import AUTO_VACUUM_INCREMENTAL
+from .maintenance import Maintenance
 from .selector import AND
 from .selector import EQ
 from .selector import OR
 from .selector import Selector
 from .selector import selector_to_sql
+from .stats import Statistics
+from .tables import ChangesColumns
 from .tables import CommentsColumns
 from .tables import HistoryColumns
 from .tables import JournalsColumns
 from .tables import SettingsColumns
 from .tables import SubmissionsColumns
+from .tables import ThumbnailsColumns
+from .tables import UserStatsColumns
 from .tables import UsersColumns
+from .tables import changes_table
 from .tables import comments_table
+from .tables import compressed_text_columns
+from .tables import epoch_date_columns
 from .tables import history_table
 from .tables import journals_table
+from .tables import search_indexes
+from .tables import search_text_columns
 from .tables import settings_table
 from .tables import submissions_table
+from .tables import thumbnails_table
+from .tables import user_stats_table
 from .tables import users_table
+from .triggers import change_log_create
+from .triggers import change_log_replaced_table
+from .triggers import change_log_tables
+from .triggers import change_log_triggers
+from .triggers import replaced_rows_create
+from .triggers import search_text_triggers
+from .triggers import user_stats_indexes
+from .triggers import user_stats_rebuild
+from .triggers import user_stats_replaced_table
+from .triggers import user_stats_triggers
 from .types import Value
-from .update import update_database
 from .util import clean_username
 from .util import compare_version
+from .util import date_range
+from .util import epoch_range
 from .util import find_connections
 from .util import guess_extension
+from .util import is_immutable
 from .util import query_to_sql
+from .util import search_text
 from .util import tiered_path
 
+if TYPE_CHECKING:
+    from sqlite3 import Blob
+
+    from psutil import Process
+
+    from .arrays import Arrays
+    from .compression import TextCompressor
+    from .bulk import ImportStats
+    from .export import ExportStats
+    from .keys import KeyFilter
+
 T = TypeVar("T")
 
+copy_batch_rows: int = 10000
+copy_batch_seconds: float = 10.
+
 
 def _copy_folder(src: Path, dest: Path):
     if src.is_dir():
@@ -77,43 +128,49 @@ def copy_cursors(db_dest: 'Database', cursors: Iterable['Cursor'], replace: bool
     elif any(c.table.database.settings.bbcode != db_dest.settings.bbcode for c in cursors):
         raise DatabaseError("Cursors and destination database must have the same BBCode setting")
 
-    for cursor in cursors:
-        cursor_db: Database = cursor.table.database
-        dest_table: Table
-        if cursor.table.name.lower() == db_dest.users.name.lower():
-            dest_table = db_dest.users
-        elif cursor.table.name.lower() == db_dest.submissions.name.lower():
-            dest_table = db_dest.submissions
-        elif cursor.table.name.lower() == db_dest.journals.name.lower():
-            dest_table = db_dest.journals
-        elif cursor.table.name.lower() == db_dest.comments.name.lower():
-            dest_table = db_dest.comments
-        elif cursor.table.name.lower() == db_dest.settings.name.lower():
-            dest_table = db_dest.settings
-        elif cursor.table.name.lower() == db_dest.history.name.lower():
-            dest_table = db_dest.history
-        else:
-            raise DatabaseError(f"Unknown table {cursor.table.name}")
-        for entry in cursor:
-            if entry[cursor.table.key.name] in dest_table and not replace:
-                continue
-            elif dest_table.name.lower() == db_dest.submissions.name.lower():
-                fs, t = cursor_db.submissions.get_submission_files(entry[cursor.table.key.name])
-                db_dest.submissions.save_submission(entry, [f.read_bytes() for f in fs or []],
-                                                    t.read_bytes() if t else None,
-                                                    replace=replace, exist_ok=exist_ok)
+    with db_dest.transaction(batch_rows=copy_batch_rows, batch_seconds=copy_batch_seconds) as transaction:
+        for cursor in cursors:
+            cursor_db: Database = cursor.table.database
+            dest_table: Table
+            if cursor.table.name.lower() == db_dest.users.name.lower():
+                dest_table = db_dest.users
+            elif cursor.table.name.lower() == db_dest.submissions.name.lower():
+                dest_table = db_dest.submissions
+            elif cursor.table.name.lower() == db_dest.journals.name.lower():
+                dest_table = db_dest.journals
+            elif cursor.table.name.lower() == db_dest.comments.name.lower():
+                dest_table = db_dest.comments
+            elif cursor.table.name.lower() == db_dest.settings.name.lower():
+                dest_table = db_dest.settings
+            elif cursor.table.name.lower() == db_dest.history.name.lower():
+                dest_table = db_dest.history
             else:
-                dest_table.insert(dest_table.format_entry(entry), replace=replace, exists_ok=True)
+                raise DatabaseError(f"Unknown table {cursor.table.name}")
+            for entry in cursor:
+                if not replace and entry[cursor.table.key.name] in dest_table:
+                    continue
+                elif dest_table.name.lower() == db_dest.submissions.name.lower():
+                    fs, _ = cursor_db.submissions.get_submission_files(entry[cursor.table.key.name])
+                    db_dest.submissions.save_submission(entry, [f.read_bytes() for f in fs or []],
+                                                        cursor_db.submissions.get_submission_thumbnail(
+                                                            entry[cursor.table.key.name]),
+                                                        replace=replace, exist_ok=exist_ok)
+                else:
+                    dest_table.insert(dest_table.format_entry(entry, validate=replace), replace=replace, exists_ok=True)
+                transaction.tick()
 
 
 class Cursor:
     def __init__(self, cursor: SQLCursor, columns: list[Column], table: 'Table', *, query: str = None,
-                 query_values: list[Any] = None):
+                 query_values: list[Any] = None, arraysize: int = None):
         self.cursor: SQLCursor = cursor
         self.columns: list[Column] = columns
         self.table: Table = table
         self.query: str | None = query
         self.query_values: list[Any] | None = query_values
+        self._arraysize: int = getattr(cursor, "arraysize", 1)
+        if arraysize is not None:
+            self.arraysize = arraysize
 
     def __next__(self) -> dict[str, Value]:
         return next(self.entries)
@@ -121,6 +178,22 @@ class Cursor:
     def __iter__(self) -> Generator[dict[str, Value], None, None]:
         return self.entries
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_val, _exc_tb):
+        self.close()
+
+    @property
+    def arraysize(self) -> int:
+        return self._arraysize
+
+    @arraysize.setter
+    def arraysize(self, value: int):
+        self._arraysize = value
+        if hasattr(self.cursor, "arraysize"):
+            self.cursor.arraysize = value
+
     @property
     def entries(self) -> Generator[dict[str, Any], None, None]:
         return ({c.name: c.from_entry(v) for c, v in zip(self.columns, row, strict=True)} for row in self.cursor)
@@ -129,23 +202,123 @@ class Cursor:
     def tuples(self) -> Generator[tuple, None, None]:
         return (tuple(c.from_entry(v) for c, v in zip(self.columns, row, strict=True)) for row in self.cursor)
 
+    def _fetch_rows(self, size: int) -> list[tuple]:
+        return self.cursor.fetchmany(size) if hasattr(self.cursor, "fetchmany") else list(islice(self.cursor, size))
+
     def fetchone(self):
         return next(self.entries, None)
 
+    def fetchmany(self, size: int = None) -> list[dict[str, Value]]:
+        if not (rows := self._fetch_rows(self.arraysize if size is None else size)):
+            return []
+        names: list[str] = [c.name for c in self.columns]
+        return [dict(zip(names, row)) for row in zip(*(c.from_entries(v) for c, v in zip(self.columns, zip(*rows))))]
+
+    def fetch_columns(self, size: int) -> dict[str, list[Any]]:
+        rows: list[tuple] = self._fetch_rows(size)
+        values: list[tuple] = list(zip(*rows)) if rows else [()] * len(self.columns)
+        return {c.name: c.from_entries(v) for c, v in zip(self.columns, values, strict=True)}
+
     def fetchall(self):
         return list(self.entries)
 
+    def count(self) -> int:
+        if self.query is None:
+            raise TypeError("Cursor has no query to count")
+        return self.table.database.execute(f"SELECT count(*) FROM ({self.query})",
+                                           self.query_values or []).fetchone()[0]
+
+    def close(self):
+        if (close := getattr(self.cursor, "close", None)) is not None:
+            close()
+
+
+class Transaction:
+    def __init__(self, database: 'Database', *, batch_rows: int = 0, batch_seconds: float = 0):
+        self.database: Database = database
+        self.batch_rows: int = batch_rows
+        self.batch_seconds: float = batch_seconds
+        self.savepoint: str | None = None
+        self.rows: int = 0
+        self.batch: int = 0
+        self.batches: int = 0
+        self._batch_start: float = 0
+
+    def __enter__(self):
+        if self.database.transactions or self.database.connection.in_transaction:
+            self.savepoint = f"TRANSACTION_{len(self.database.transactions)}"
+            self.database.connection.execute(f"SAVEPOINT {self.savepoint}")
+        else:
+            self.database.connection.execute("BEGIN")
+        self.database.transactions.append(self)
+        self._batch_start = monotonic()
+        return self
+
+    def __exit__(self, exc_type, _exc_val, _exc_tb):
+        self.database.transactions.remove(self)
+        try:
+            if self.savepoint is not None and exc_type is None:
+                self.database.connection.execute(f"RELEASE SAVEPOINT {self.savepoint}")
+            elif self.savepoint is not None:
+                self.database.connection.execute(f"ROLLBACK TO SAVEPOINT {self.savepoint}")
+                self.database.connection.execute(f"RELEASE SAVEPOINT {self.savepoint}")
+            elif exc_type is None:
+                self.database.commit()
+            else:
+                self.database.connection.rollback()
+        except BaseException:
+            self.database.rollbacks += 1
+            raise
+        if exc_type is not None:
+            self.database.rollbacks += 1
+
+    @property
+    def is_nested(self) -> bool:
+        return self.savepoint is not None
+
+    def commit(self):
+        if self.is_nested:
+            raise DatabaseError("Cannot commit a nested transaction.")
+        self.database.commit()
+        self.database.connection.execute("BEGIN")
+        self.batch = 0
+        self.batches += 1
+        self._batch_start = monotonic()
+
+    # Batches are only committed by the outermost transaction, nested ones are part of their parent's batch
+    def tick(self, rows: int = 1):
+        self.rows += rows
+        self.batch += rows
+        if self.is_nested:
+            return
+        elif (self.batch_rows and self.batch >= self.batch_rows) or \
+                (self.batch_seconds and monotonic() - self._batch_start >= self.batch_seconds):
+            self.commit()
+
 
 class Table:
+    search: 'SearchTable | None' = None
+    date_unit: timedelta | None = None
+
     def __init__(self, database: "Database", name: str, columns: Iterable[Column] = None):
         self.database: Database = database
         self.name: str = name
         self._columns: list[Column] = columns or []
+        self._encoder: tuple[list[Column], Encoder] | None = None
+        self._key_filter: KeyFilter | None = None
+        self._key_filter_rollbacks: int = 0
 
     def __len__(self) -> int:
         return self.select(columns=[Column(f"count({self.key.name})", int)]).cursor.fetchone()[0]
 
     def __contains__(self, key: Value) -> bool:
+        if (key_filter := self._current_key_filter()) is not None:
+            if (key := self.key.to_entry(key)) not in key_filter:
+                return False
+            elif key_filter.exact:
+                return True
+            return self.database.execute(f"SELECT 1 FROM {self.name} WHERE {self.key.name} = ?",
+                                         [key]).fetchone() is not None
         return bool(self[key])
 
     @overload
@@ -202,9 +375,18 @@ class Table:
     def keys(self) -> list[Column]:
         return [c for c in self.columns if c.key]
 
+    @property
+    def date_bounds(self) -> Callable[[str], tuple[Value, Value] | None]:
+        return date_range if (unit := self.date_unit) is None else lambda v: epoch_range(v, unit)
+
+    @property
+    def encoder(self) -> Encoder:
+        if self._encoder is None or self._encoder[0] is not self.columns:
+            self._encoder = (self.columns, get_encoder(tuple(self.columns)))
+        return self._encoder[1]
+
     def get_column(self, name: str) -> Column | None:
-        name = name.lower()
-        return next((c for c in self.columns if c.name.lower() == name.lower()), None)
+        return self.encoder.names.get(name.lower())
 
     def create_statement(self, exists_ignore: bool = False) -> str:
         elements: list[str] = ["create table"]
@@ -224,20 +406,21 @@ class Table:
     def create(self, exists_ignore: bool = True):
         self.database.execute(self.create_statement(exists_ignore=exists_ignore))
 
-    def format_entry(self, entry: dict[str, Any], *, defaults: bool = True) -> dict[str, Value]:
-        columns_dict: dict[str, Any] = {}
-        if defaults:
-            columns_dict = {c.name.upper(): c.default for c in self.columns if c.default is not NoDefault}
-        entry = columns_dict | {k.upper(): v for k, v in entry.items()}
-        entry = {(c := self.get_column(k)).name: c.to_entry(v) for k, v in entry.items()}
-        return entry
+    def format_entry(self, entry: dict[str, Any], *, defaults: bool = True, validate: bool = None
+                     ) -> dict[str, Value]:
+        return self.encoder.encode(entry, defaults=defaults, validate=validate)
 
     def insert(self, entry: dict[str, Value], *, replace: bool = False, exists_ok: bool = False):
-        self.database.execute(
+        cursor: SQLCursor = self.database.execute(
             f"""INSERT {'OR REPLACE' if replace else 'OR IGNORE' if exists_ok else ''} INTO {self.name}
                     ({','.join(entry.keys())}) VALUES ({','.join(['?'] * len(entry))})""",
             [v for v in entry.values()]
         )
+        if (key_filter := self._current_key_filter()) is not None and cursor.rowcount > 0:
+            key_filter.add(entry.get(self.key.name, cursor.lastrowid))
+        if self.search is not None and cursor.rowcount > 0 and self.search.is_enabled and \
+                (column := self.search.column.name) in entry:
+            self.search.index([(entry[self.key.name], entry[column])])
 
     def select(self, query: Selector = None, columns: list[str | Column] = None, order: list[str] = None,
                limit: int = 0,
@@ -245,11 +428,24 @@ class Table:
         sql, values = selector_to_sql(query) if query else ("", None)
         return self.select_sql(sql, values, columns, order, limit, offset)
 
+    def query_sql(self, query: str, default_field: str = None, likes: list[str] = None,
+                  aliases: dict[str, str] = None) -> tuple[str, list[Value]]:
+        aliases = {c.name.lower(): f"decompress({c.name})" for c in self.columns if getattr(c, "compressor", None)
+                   and (self.search is None or not self.search.is_enabled or c.name != self.search.column.name)
+                   } | (aliases or {})
+        elements, values = query_to_sql(query, default_field or self.key.name, likes, aliases,
+                                        [c.name.lower() for c in self.columns if c.sql_type == "integer"],
+                                        [c.name.lower() for c in self.columns if c.sql_type == "datetime"],
+                                        {self.search.column.name.lower(): self.search.search_sql}
+                                        if self.search is not None and self.search.is_enabled else None,
+                                        self.date_bounds)
+        return " ".join(elements), values
+
     def select_query(self, query: str, columns: list[str | Column] = None, default_field: str = None,
                      likes: list[str] = None, aliases: dict[str, str] = None, order: list[str] = None, limit: int = 0,
                      offset: int = 0) -> Cursor:
-        elements, values = query_to_sql(query, default_field or self.key.name, likes, aliases)
-        return self.select_sql(" ".join(elements), values, columns, order, limit, offset)
+        sql, values = self.query_sql(query, default_field, likes, aliases)
+        return self.select_sql(sql, values, columns, order, limit, offset)
 
     def select_sql(self, sql: str, values: list[Any] = None, columns: list[str | Column] = None,
                    order: list[str] = None, limit: int = 0, offset: int = 0) -> Cursor:
@@ -260,18 +456,89 @@ class Table:
                                           f"ORDER BY {','.join(order)}" if order else None,
                                           f"LIMIT {limit}" if limit > 0 else None,
                                           f"OFFSET {offset}" if limit > 0 and offset > 0 else None])))
-        return Cursor(self.database.execute(sql, values), columns_, self, query=sql, query_values=values)
+        return Cursor(self.database.query_cache.execute(sql, values) if self.database.query_cache.enabled else
+                      self.database.execute(sql, values), columns_, self, query=sql, query_values=values)
+
+    def export(self, path: str | PathLike | Path, format_: str = None, *, query: Selector | str = None,
+               columns: list[str | Column] = None, order: list[str] = None, chunk_size: int = 10000,
+               decode: bool = False) -> "ExportStats":
+        from .export import export_cursor
+
+        cursor: Cursor = self.select_query(query, columns, order=order) if isinstance(query, str) else \
+            self.select(query, columns, order=order)
+        return export_cursor(path, cursor.cursor, cursor.columns, format_=format_, chunk_size=chunk_size,
+                             decode=decode)
+
+    def to_arrays(self, columns: list[str | Column] = None, query: Selector | str = None, *, order: list[str] = None,
+                  chunk_size: int = 10000, cache: str | PathLike | Path = None) -> "Arrays":
+        from .arrays import table_to_arrays
+
+        cursor: Cursor = self.select_query(query, columns, order=order) if isinstance(query, str) else \
+            self.select(query, columns, order=order)
+        return table_to_arrays(self, cursor.cursor, cursor.columns, cursor.query, cursor.query_values,
+                               chunk_size=chunk_size, cache=Path(cache) if cache is not None else None)
+
+    def parallel_scan(self, query: Selector | str = None, columns: list[str | Column] = None,
+                      fn: Callable[[Iterable[dict[str, Value]]], T] = list, *, workers: int = None,
+                      partitions: int = None, ordered: bool = True) -> Generator[T, None, None]:
+        from .scan import parallel_scan
+
+        sql, values = self.query_sql(query) if isinstance(query, str) else \
+            selector_to_sql(query) if query else ("", [])
+        return parallel_scan(self, sql, values, [c.name if isinstance(c, Column) else c for c in columns or []] or None,
+                             fn, workers=workers, partitions=partitions, ordered=ordered)
 
     def update(self, query: Selector, new_entry: dict[str, Value]) -> SQLCursor:
         sql, values = selector_to_sql(query) if query else ("", [])
         update_columns: list[str] = [f"{col} = ?" for col in new_entry]
-        return self.database.execute(f"UPDATE {self.name} SET {','.join(update_columns)} WHERE {sql}",
-                                     [*new_entry.values(), *values])
+        key_filter: KeyFilter | None = self._current_key_filter()
+        old_keys: list[tuple[Value]] = self.database.execute(
+            f"SELECT {self.key.name} FROM {self.name} WHERE {sql}", values).fetchall() \
+            if key_filter is not None and self.key.name in {c.upper() for c in new_entry} else []
+        cursor: SQLCursor = self.database.execute(f"UPDATE {self.name} SET {','.join(update_columns)} WHERE {sql}",
+                                                  [*new_entry.values(), *values])
+        if old_keys and cursor.rowcount > 0:
+            for [key] in old_keys:
+                key_filter.discard(key)
+            key_filter.add(next(v for c, v in new_entry.items() if c.upper() == self.key.name))
+        if self.search is not None and self.search.is_enabled and \
+                {self.key.name, self.search.column.name} & {c.upper() for c in new_entry}:
+            self.search.index(self.database.execute(
+                f"SELECT {self.key.name}, {self.search.column.name} FROM {self.name} WHERE {sql}", values))
+        return cursor
 
     def delete(self, query: Selector) -> SQLCursor:
         sql, values = selector_to_sql(query) if query else ("", [])
+        if (key_filter := self._current_key_filter()) is not None and key_filter.exact:
+            for [key] in self.database.execute(f"SELECT {self.key.name} FROM {self.name} WHERE {sql}", values):
+                key_filter.discard(key)
         return self.database.execute(f"DELETE FROM {self.name} WHERE {sql}", values)
 
+    def key_filter(self, path: str | PathLike | Path = None, *, rebuild: bool = False) -> "KeyFilter":
+        from .keys import build_key_filter
+        from .keys import load_key_filter
+
+        if rebuild or self._key_filter is None:
+            self._key_filter = (None if rebuild or path is None else load_key_filter(self, Path(path))) or \
+                               build_key_filter(self)
+            self._key_filter_rollbacks = self.database.rollbacks
+        return self._key_filter
+
+    # Key filters follow uncommitted changes, so they are rebuilt from the table after the database rolls back
+    def _current_key_filter(self) -> "KeyFilter | None":
+        if self._key_filter is not None and self._key_filter_rollbacks != self.database.rollbacks:
+            self.key_filter(rebuild=True)
+        return self._key_filter
+
+    def save_key_filter(self, path: str | PathLike | Path):
+        from .keys import table_stamp
+
+        if self._key_filter is not None:
+            self._key_filter.save(Path(path), table_stamp(self))
+
+    def drop_key_filter(self):
+        self._key_filter = None
+
     def add_to_list(self, key: Value, column: str | Column, new_values: Iterable[Value]):
         entry: dict = self._get_exists(key)
         column = column.name if isinstance(column, Column) else self.get_column(column).name
@@ -290,9 +557,174 @@ class Table:
         return changes
 
 
+class SearchTable(Table):
+    def __init__(self, table: Table, column: Column):
+        super().__init__(table.database, f"{table.name}_SEARCH", [table.key, Column(column.name, str)])
+        self.table: Table = table
+        self.column: Column = column
+        self._enabled: bool | None = None
+
+    @property
+    def is_enabled(self) -> bool:
+        if self._enabled is None:
+            self._enabled = bool(self.database.execute(
+                "select count(*) from sqlite_master where type = 'table' and name = ?", [self.name]).fetchone()[0])
+        return self._enabled
+
+    @property
+    def search_sql(self) -> str:
+        return f"{self.table.key.name} in (select {self.key.name} from {self.name} where {{}})"
+
+    def enable(self, *, populate: bool = True, batch_size: int = 1000):
+        self.create(exists_ignore=True)
+        for trigger in search_text_triggers(self.name, self.table.name, self.key.name, self.column.name):
+            self.database.execute(trigger)
+        self._enabled = True
+        if populate:
+            self.populate(batch_size)
+
+    def disable(self):
+        for [name] in self.database.execute("select name from sqlite_master where type = 'trigger' and name glob ?",
+                                            [f"{self.name}_*"]).fetchall():
+            self.database.execute(f"DROP TRIGGER IF EXISTS {name}")
+        self.database.execute(f"DROP TABLE IF EXISTS {self.name}")
+        self._enabled = False
+
+    def index(self, rows: Iterable[tuple[Value, str | bytes | None]]):
+        decode: Callable[[Value], str | None] = self.table.get_column(self.column.name).from_entry
+        self.database.connection.executemany(
+            f"INSERT OR REPLACE INTO {self.name} ({self.key.name}, {self.column.name}) VALUES (?, ?)",
+            ((key, search_text(decode(markup) if isinstance(markup, bytes) else markup)) for key, markup in rows))
+
+    def populate(self, batch_size: int = 1000) -> int:
+        key, last, total = self.key.name, None, 0
+        with self.database.transaction(batch_rows=batch_size) as transaction:
+            while rows := self.database.execute(
+                    f"""SELECT {key}, {self.column.name} FROM {self.table.name} T
+                    WHERE {'true' if last is None else f'{key} > ?'}
+                    AND NOT EXISTS (SELECT 1 FROM {self.name} S WHERE S.{key} = T.{key})
+                    ORDER BY {key} LIMIT ?""",
+                    [batch_size] if last is None else [last, batch_size]).fetchall():
+                self.index(rows)
+                last, total = rows[-1][0], total + len(rows)
+                transaction.tick(len(rows))
+        return total
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        self.database.execute(f"DELETE FROM {self.name}")
+        return self.populate(batch_size)
+
+
+class ThumbnailsTable(Table):
+    def __init__(self, database: "Database", name: str, columns: Iterable[Column] = None):
+        super().__init__(database, name, columns)
+        self._enabled: bool | None = None
+
+    def __contains__(self, submission_id: int) -> bool:
+        return self.database.execute(f"SELECT 1 FROM {self.name} WHERE {self.key.name} = ?",
+                                     [submission_id]).fetchone() is not None
+
+    @property
+    def is_enabled(self) -> bool:
+        if self._enabled is None:
+            self._enabled = bool(self.database.execute(
+                "select count(*) from sqlite_master where type = 'table' and name = ?", [self.name]).fetchone()[0])
+        return self._enabled
+
+    def enable(self):
+        self.create(exists_ignore=True)
+        self._enabled = True
+
+    def open(self, submission_id: int) -> "Blob":
+        return self.database.connection.blobopen(self.name, ThumbnailsColumns.THUMBNAIL.name, submission_id,
+                                                 readonly=True)
+
+    def save_thumbnail(self, submission_id: int, file: bytes):
+        self.insert({self.key.name: submission_id, ThumbnailsColumns.THUMBNAIL.name: file}, replace=True)
+
+    def get_thumbnail(self, submission_id: int) -> bytes | None:
+        if not hasattr(self.database.connection, "blobopen"):
+            return (entry := self[submission_id]) and entry[ThumbnailsColumns.THUMBNAIL.name]
+        try:
+            with self.open(submission_id) as blob:
+                return blob.read()
+        except OperationalError:
+            return None
+
+    def get_thumbnails(self, submission_ids: Iterable[int], chunk_size: int = 500) -> dict[int, bytes]:
+        thumbnails: dict[int, bytes] = {}
+        submission_ids = list(submission_ids)
+        for n in range(0, len(submission_ids), chunk_size):
+            chunk: list[int] = submission_ids[n:n + chunk_size]
+            thumbnails.update(self.database.execute(
+                f"SELECT {self.key.name}, {ThumbnailsColumns.THUMBNAIL.name} FROM {self.name} "
+                f"WHERE {self.key.name} in ({','.join('?' * len(chunk))})", chunk))
+        return thumbnails
+
+    # Thumbnails are deleted with their submission by SubmissionsTable.delete, this removes those left behind by
+    # submissions deleted by other clients
+    def prune(self) -> int:
+        if not self.is_enabled:
+            return 0
+        submissions: Table = self.database.submissions
+        return self.database.execute(
+            f"DELETE FROM {self.name} WHERE {self.key.name} NOT IN "
+            f"(SELECT {submissions.key.name} FROM {submissions.name})").rowcount
+
+    def pack(self, *, delete_files: bool = True, batch_size: int = 1000) -> int:
+        self.enable()
+        submissions: SubmissionsTable = self.database.submissions
+        files_folder: Path = submissions.files_folder
+        last, total = 0, 0
+        while rows := self.database.execute(
+                f"""SELECT {submissions.key.name} FROM {submissions.name}
+                WHERE {submissions.key.name} > ? AND {SubmissionsColumns.FILESAVED.name} & 1
+                AND {submissions.key.name} NOT IN (SELECT {self.key.name} FROM {self.name})
+                ORDER BY {submissions.key.name} LIMIT ?""", [last, batch_size]).fetchall():
+            files: list[tuple[int, Path]] = [(id_, f) for [id_] in rows
+                                             if (f := files_folder / tiered_path(id_) / "thumbnail.jpg").is_file()]
+            with self.database.transaction():
+                self.database.connection.executemany(
+                    f"INSERT OR REPLACE INTO {self.name} ({self.key.name}, {ThumbnailsColumns.THUMBNAIL.name}) "
+                    f"VALUES (?, ?)", ((id_, f.read_bytes()) for id_, f in files))
+            if delete_files:
+                for _, file in files:
+                    file.unlink(missing_ok=True)
+            last, total = rows[-1][0], total + len(files)
+        return total
+
+
 class UsersTable(Table):
+    def __init__(self, database: "Database", name: str, columns: Iterable[Column] = None):
+        super().__init__(database, name, columns)
+        self.stats: Table = Table(database, user_stats_table, UserStatsColumns.as_list())
+        self.search: SearchTable = SearchTable(self, search_text_columns[users_table])
+
+    @property
+    def has_stats(self) -> bool:
+        return self.stats in self.database
+
+    def get_stats(self, user: str) -> dict[str, Value] | None:
+        return self.stats[clean_username(user)]
+
+    def rebuild_stats(self):
+        self.stats.create(exists_ignore=True)
+        for statement in [*user_stats_indexes(), replaced_rows_create(user_stats_replaced_table),
+                          *user_stats_triggers()]:
+            self.database.execute(statement)
+        self.database.execute(f"DELETE FROM {self.stats.name}")
+        self.database.execute(user_stats_rebuild())
+
+    def drop_stats(self):
+        for [type_, name] in self.database.execute(
+                "select type, name from sqlite_master where type in ('trigger', 'index') and name glob ?",
+                [f"{self.stats.name}_*"]).fetchall():
+            self.database.execute(f"DROP {type_} IF EXISTS {name}")
+        self.database.execute(f"DROP TABLE IF EXISTS {user_stats_replaced_table}")
+        self.database.execute(f"DROP TABLE IF EXISTS {self.stats.name}")
+
     def save_user(self, user: dict[str, Any], *, replace: bool = False, exist_ok: bool = False):
-        self.insert(self.format_entry(user), replace=replace, exists_ok=exist_ok)
+        self.insert(self.format_entry(user, validate=replace or not exist_ok), replace=replace, exists_ok=exist_ok)
 
     def set_active(self, user: str, active: bool) -> bool:
         if (entry := self._get_exists(user := clean_username(user)))[UsersColumns.ACTIVE.name] is active:
@@ -316,13 +748,25 @@ class UsersTable(Table):
 
 
 class SubmissionsTable(Table):
+    def __init__(self, database: "Database", name: str, columns: Iterable[Column] = None):
+        super().__init__(database, name, columns)
+        self.search: SearchTable = SearchTable(self, search_text_columns[submissions_table])
+        self.thumbnails: ThumbnailsTable = ThumbnailsTable(database, thumbnails_table, ThumbnailsColumns.as_list())
+
     @property
     def files_folder(self) -> Path:
         return self.database.settings.files_folder
 
+    def delete(self, query: Selector) -> SQLCursor:
+        if self.thumbnails.is_enabled:
+            sql, values = selector_to_sql(query) if query else ("", [])
+            self.database.execute(f"DELETE FROM {self.thumbnails.name} WHERE {self.thumbnails.key.name} IN "
+                                  f"(SELECT {self.key.name} FROM {self.name} WHERE {sql})", values)
+        return super().delete(query)
+
     def save_submission(self, submission: dict[str, Value | list[Value]], files: list[bytes] = None,
                         thumbnail: bytes = None, *, replace: bool = False, exist_ok: bool = False):
-        submission = self.format_entry(submission)
+        submission = self.format_entry(submission, validate=replace or not exist_ok)
         file_url: list[str] = \
             SubmissionsColumns.FILEURL.from_entry(submission[SubmissionsColumns.FILEURL.name])
 
@@ -352,11 +796,16 @@ class SubmissionsTable(Table):
         folder: Path = self.files_folder / tiered_path(submission_id)
         folder.mkdir(parents=True, exist_ok=True)
         folder.joinpath(f"{name}{n if n > 0 else ''}" + f".{ext}" * bool(ext)).write_bytes(file)
+        self.database.instrumentation.count("files_written")
+        self.database.instrumentation.count("file_bytes_written", len(file))
 
         return ext
 
     def save_submission_thumbnail(self, submission_id: int, file: bytes | None):
-        self.save_submission_file(submission_id, file, "thumbnail", "jpg", False)
+        if file is not None and self.thumbnails.is_enabled:
+            self.thumbnails.save_thumbnail(submission_id, file)
+        else:
+            self.save_submission_file(submission_id, file, "thumbnail", "jpg", False)
 
     def get_submission_files(self, submission_id: int) -> tuple[list[Path] | None, Path | None]:
         if (entry := self[submission_id]) is None or (f := entry[SubmissionsColumns.FILESAVED.name]) == 0:
@@ -366,9 +815,16 @@ class SubmissionsTable(Table):
         return (
             [folder / f"submission{n or ''}{('.' + ext) if ext else ''}"
              for n, ext in enumerate(file_ext)] if f & 0b10 else None,
-            folder / "thumbnail.jpg" if f & 0b01 else None
+            folder / "thumbnail.jpg"
+            if f & 0b01 and not (self.thumbnails.is_enabled and submission_id in self.thumbnails) else None
         )
 
+    def get_submission_thumbnail(self, submission_id: int) -> bytes | None:
+        if self.thumbnails.is_enabled and (thumbnail := self.thumbnails.get_thumbnail(submission_id)) is not None:
+            return thumbnail
+        _, file = self.get_submission_files(submission_id)
+        return file.read_bytes() if file is not None and file.is_file() else None
+
     def set_filesaved(self, submission_id: int, all_files: bool | int, any_file: bool | int, thumbnail: bool | int):
         filesaved: int = (0b100 * bool(all_files)) + (0b010 * bool(any_file)) + (0b001 * bool(thumbnail))
         if self._get_exists(submission_id)[SubmissionsColumns.FILESAVED.name] != filesaved:
@@ -402,8 +858,12 @@ class SubmissionsTable(Table):
 
 
 class JournalsTable(Table):
+    def __init__(self, database: "Database", name: str, columns: Iterable[Column] = None):
+        super().__init__(database, name, columns)
+        self.search: SearchTable = SearchTable(self, search_text_columns[journals_table])
+
     def save_journal(self, journal: dict[str, Any], *, replace: bool = False, exist_ok: bool = False):
-        self.insert(self.format_entry(journal), replace=replace, exists_ok=exist_ok)
+        self.insert(self.format_entry(journal, validate=replace or not exist_ok), replace=replace, exists_ok=exist_ok)
 
     def set_user_update(self, journal_id: int, update: bool) -> bool:
         if self._get_exists(journal_id)[JournalsColumns.USERUPDATE.name] != update:
@@ -420,13 +880,16 @@ class JournalsTable(Table):
 
 class CommentsTable(Table):
     def save_comment(self, comment: dict[str, any], *, replace: bool = False, exist_ok: bool = False):
-        self.insert(self.format_entry(comment), replace=replace, exists_ok=exist_ok)
+        self.insert(self.format_entry(comment, validate=replace or not exist_ok), replace=replace, exists_ok=exist_ok)
 
-    def get_comments(self, parent_table: str, parent_id: int) -> list[dict]:
-        return list(self.select_sql(
+    def select_comments(self, parent_table: str, parent_id: int) -> Cursor:
+        return self.select_sql(
             f"{CommentsColumns.PARENT_TABLE.name} = ? and {CommentsColumns.PARENT_ID.name} = ?",
             [parent_table, parent_id],
-            order=[f"{CommentsColumns.ID.name} ASC"]))
+            order=[f"{CommentsColumns.ID.name} ASC"])
+
+    def get_comments(self, parent_table: str, parent_id: int) -> list[dict]:
+        return self.select_comments(parent_table, parent_id).fetchall()
 
     def get_comments_tree(self, parent_table: str, parent_id: int) -> list[dict]:
         comments: list[dict] = self.get_comments(parent_table, parent_id)
@@ -446,6 +909,8 @@ class SettingsTable(Table):
     files_folder_setting: str = "FILESFOLDER"
     backup_folder_setting: str = "BACKUPFOLDER"
     bbcode_setting: str = "BBCODE"
+    date_format_setting: str = "DATEFORMAT"
+    compression_dictionary_setting: str = "COMPRESSIONDICT"
     _default_files_folder: str = "FA.files"
     _default_backup_folder: str = "FA.backup"
 
@@ -493,6 +958,29 @@ class SettingsTable(Table):
         else:
             self[self.bbcode_setting] = "true" if value else "false"
 
+    @property
+    def epoch_dates(self) -> bool:
+        return self[self.date_format_setting] == "epoch"
+
+    @epoch_dates.setter
+    def epoch_dates(self, value: bool):
+        self[self.date_format_setting] = "epoch" if value else "text"
+
+    @property
+    def compression_dictionary(self) -> bytes | None:
+        if (dictionary := self[self.compression_dictionary_setting]) is None:
+            return None
+        from base64 import b64decode
+        return b64decode(dictionary)
+
+    @compression_dictionary.setter
+    def compression_dictionary(self, value: bytes | None):
+        if value is None:
+            del self[self.compression_dictionary_setting]
+        else:
+            from base64 import b64encode
+            self[self.compression_dictionary_setting] = b64encode(value).decode()
+
     def create(self, exists_ignore: bool = False):
         super().create(exists_ignore=exists_ignore)
         self.insert({SettingsColumns.SETTING.name: self.files_folder_setting,
@@ -502,23 +990,189 @@ class SettingsTable(Table):
 
 
 class HistoryTable(Table):
+    retention_setting: str = "HISTORYRETENTION"
+    rollup_prefix: str = "ROLLUP "
+
+    def __init__(self, database: "Database", name: str, columns: Iterable[Column] = None):
+        super().__init__(database, name, columns)
+        self.buffer: list[tuple[Value, str]] = []
+        self.buffer_size: int = 0
+        self.buffer_seconds: float = 0
+        self._buffer_start: float = 0
+
     def __iter__(self) -> Generator[dict[str, Value], None, None]:
+        self.flush()
         return self.select(order=[self.key.name]).entries
 
+    @property
+    def retention(self) -> tuple[int | None, int | None]:
+        days, _, events = (self.database.settings[self.retention_setting] or ",").partition(",")
+        return int(days) if days else None, int(events) if events else None
+
+    @retention.setter
+    def retention(self, value: tuple[int | None, int | None] | None):
+        if value is None or value == (None, None):
+            del self.database.settings[self.retention_setting]
+        else:
+            self.database.settings[self.retention_setting] = ",".join("" if v is None else str(v) for v in value)
+
     def add_event(self, event: str, time: datetime = None):
-        self[time or datetime.now()] = {HistoryColumns.EVENT.name: event}
+        if not self.buffer_size and not self.buffer_seconds:
+            self[time or datetime.now()] = {HistoryColumns.EVENT.name: event}
+            return
+        elif not self.buffer:
+            self._buffer_start = monotonic()
+        self.buffer.append((self.key.to_entry(time or datetime.now()), event))
+        if (self.buffer_size and len(self.buffer) >= self.buffer_size) or \
+                (self.buffer_seconds and monotonic() - self._buffer_start >= self.buffer_seconds):
+            self.flush()
+
+    def add_events(self, events: Iterable[tuple[datetime, str]]):
+        self.database.connection.executemany(
+            f"INSERT OR REPLACE INTO {self.name} ({self.key.name}, {HistoryColumns.EVENT.name}) VALUES (?, ?)",
+            ((self.key.to_entry(time), event) for time, event in events))
+
+    # Buffered events are written when the buffer is full, when the oldest one is older than buffer_seconds (checked
+    # when events are added), and before the database commits or closes
+    def set_buffer(self, size: int = 1000, seconds: float = 5.):
+        self.flush()
+        self.buffer_size, self.buffer_seconds = size, seconds
+
+    def flush(self) -> int:
+        if not self.buffer:
+            return 0
+        rows, self.buffer = self.buffer, []
+        self.database.connection.executemany(
+            f"INSERT OR REPLACE INTO {self.name} ({self.key.name}, {HistoryColumns.EVENT.name}) VALUES (?, ?)", rows)
+        return len(rows)
+
+    def select_range(self, start: datetime = None, end: datetime = None, *, reverse: bool = False,
+                     limit: int = 0) -> Cursor:
+        self.flush()
+        conditions: list[str] = [f"{self.key.name} {op} ?" for op, t in ((">=", start), ("<", end)) if t is not None]
+        return self.select_sql(" and ".join(conditions), [self.key.to_entry(t) for t in (start, end) if t is not None],
+                               order=[f"{self.key.name} {'DESC' if reverse else 'ASC'}"], limit=limit)
+
+    # Events older than the cutoff are deleted, or replaced by one summary event per day that counts them by their
+    # first word; summaries are kept by later prunes
+    def prune(self, days: int = None, events: int = None, *, rollup: bool = True) -> int:
+        self.flush()
+        key, event = self.key.name, HistoryColumns.EVENT.name
+        cutoffs: list[Value] = []
+        if days is not None:
+            cutoffs.append(self.key.to_entry(datetime.now() - timedelta(days=days)))
+        if events is not None and (row := self.database.execute(
+                f"SELECT {key} FROM {self.name} WHERE {event} NOT LIKE '{self.rollup_prefix}%' "
+                f"ORDER BY {key} DESC LIMIT 1 OFFSET ?", [max(events, 1) - 1]).fetchone()) is not None:
+            cutoffs.append(row[0])
+        if not cutoffs:
+            return 0
+        where: str = f"{key} < ? AND {event} NOT LIKE '{self.rollup_prefix}%'"
+        with self.database.transaction():
+            summaries: dict[datetime, tuple[datetime, Counter[str]]] = {}
+            if rollup:
+                for time, text in self.select_sql(where, [max(cutoffs)], [key, event], order=[key]).tuples:
+                    day: datetime = time.replace(hour=0, minute=0, second=0, microsecond=0)
+                    counts: Counter[str] = summaries[day][1] if day in summaries else Counter()
+                    counts[text.split(" ", 1)[0] if text else ""] += 1
+                    summaries[day] = (time, counts)
+            deleted: int = self.database.execute(f"DELETE FROM {self.name} WHERE {where}", [max(cutoffs)]).rowcount
+            self.add_events((last, f"{self.rollup_prefix}{counts.total()} events: " +
+                             ", ".join(f"{name} {n}" for name, n in counts.most_common()))
+                            for last, counts in summaries.values())
+        return deleted
+
+    def apply_retention(self, *, rollup: bool = True) -> int:
+        days, events = self.retention
+        return self.prune(days, events, rollup=rollup) if days is not None or events is not None else 0
+
+
+class ChangesTable(Table):
+    pruned_setting: str = "CHANGESPRUNED"
+
+    @property
+    def is_enabled(self) -> bool:
+        return bool(self.database.execute("select count(*) from sqlite_master where type = 'trigger' and name glob ?",
+                                          [f"{self.name}_*"]).fetchone()[0])
+
+    @property
+    def last_seq(self) -> int:
+        if self not in self.database:
+            return 0
+        return self.database.execute(f"SELECT max({self.key.name}) FROM {self.name}").fetchone()[0] or 0
+
+    @property
+    def pruned_seq(self) -> int:
+        return int(self.database.settings[self.pruned_setting] or 0)
+
+    def create_statement(self, exists_ignore: bool = False) -> str:
+        return change_log_create(exists_ignore=exists_ignore)
+
+    def enable(self):
+        self.create(exists_ignore=True)
+        self.database.execute(replaced_rows_create(change_log_replaced_table))
+        for trigger in change_log_triggers():
+            self.database.execute(trigger)
+
+    def disable(self, *, drop: bool = False):
+        for [name] in self.database.execute("select name from sqlite_master where type = 'trigger' and name glob ?",
+                                            [f"{self.name}_*"]).fetchall():
+            self.database.execute(f"DROP TRIGGER IF EXISTS {name}")
+        self.database.execute(f"DROP TABLE IF EXISTS {change_log_replaced_table}")
+        if drop:
+            self.database.execute(f"DROP TABLE IF EXISTS {self.name}")
+
+    def since(self, seq: int = 0, tables: list[str] = None, limit: int = 0) -> Cursor:
+        tables = [t.upper() for t in tables or []]
+        return self.select_sql(f"{ChangesColumns.SEQ.name} > ?" +
+                               (f" and {ChangesColumns.TABLE_NAME.name} in ({','.join('?' * len(tables))})"
+                                if tables else ""),
+                               [seq, *tables], order=[ChangesColumns.SEQ.name], limit=limit)
+
+    def changed_keys(self, seq: int = 0, until: int = None) -> dict[str, list[tuple]]:
+        changed: dict[str, list[tuple]] = {}
+        for table, key in self.database.execute(
+                f"""SELECT DISTINCT {ChangesColumns.TABLE_NAME.name}, {ChangesColumns.ROW_KEY.name} FROM {self.name}
+                WHERE {ChangesColumns.SEQ.name} > ? AND {ChangesColumns.SEQ.name} <= ?""",
+                [seq, self.last_seq if until is None else until]):
+            changed.setdefault(table, []).append(tuple(ChangesColumns.ROW_KEY.from_entry(key)))
+        return changed
+
+    def prune(self, seq: int):
+        self.database.execute(f"DELETE FROM {self.name} WHERE {ChangesColumns.SEQ.name} <= ?", [seq])
+        self.database.settings[self.pruned_setting] = str(max(seq, self.pruned_seq))
 
 
 class Database:
+    mmap_size: int = 1 << 40
+
     def __init__(self, path: str | PathLike | Path, *, init: bool = False, check_connections: bool = True,
-                 check_version: bool = True, read_only: bool = False, autocommit: bool = False):
+                 check_version: bool = True, read_only: bool = False, autocommit: bool = False,
+                 check_same_thread: bool = True, read_optimized: bool = False, immutable: bool = None):
         self.path: Path = Path(path).resolve()
-        self.read_only: bool = read_only
+        self.read_optimized: bool = read_optimized
+        self.read_only: bool = read_only or read_optimized
+        self.immutable: bool = read_optimized and (is_immutable(self.path) if immutable is None else immutable)
+        self.check_same_thread: bool = check_same_thread
 
-        if check_connections:
+        if check_connections and not read_optimized:
             self.check_connection()
 
-        self.connection: Connection = connect(self.path.as_uri() + ("?mode=ro" if read_only else ""), uri=True)
+        uri_parameters: dict[str, str] = {}
+        if self.read_only:
+            uri_parameters["mode"] = "ro"
+        if read_optimized:
+            uri_parameters["cache"] = "shared"
+        if self.immutable:
+            uri_parameters["immutable"] = "1"
+
+        self.connection: Connection = connect(
+            self.path.as_uri() + (f"?{urlencode(uri_parameters)}" if uri_parameters else ""), uri=True,
+            check_same_thread=check_same_thread)
+        self.connection.execute("pragma recursive_triggers = on")
+        if read_optimized:
+            self.connection.execute(f"pragma mmap_size = {self.mmap_size}")
+            self.connection.execute("pragma query_only = on")
         self.autocommit = autocommit
 
         self.users: UsersTable = UsersTable(self, users_table, UsersColumns.as_list())
@@ -527,10 +1181,28 @@ class Database:
         self.comments: CommentsTable = CommentsTable(self, comments_table, CommentsColumns.as_list())
         self.settings: SettingsTable = SettingsTable(self, settings_table, SettingsColumns.as_list())
         self.history: HistoryTable = HistoryTable(self, history_table, HistoryColumns.as_list())
+        self.changes: ChangesTable = ChangesTable(self, changes_table, ChangesColumns.as_list())
+        self.stats: Statistics = Statistics(self)
+        if getattr(self, "instrumentation", None) is None:
+            self.instrumentation: Instrumentation = Instrumentation(self)
+        if getattr(self, "query_cache", None) is None:
+            self.query_cache: QueryCache = QueryCache(self)
+        self.query_cache.clear()
+        self.maintenance: Maintenance = Maintenance(self)
 
         self.committed_changes: int = self.total_changes
-
-        if self.is_formatted:
+        self.transactions: list[Transaction] = []
+        self.rollbacks: int = 0
+
+        if (formatted := self.is_formatted) and self.settings.epoch_dates:
+            self._set_date_columns(True)
+        if formatted and (dictionary := self.settings.compression_dictionary) is not None:
+            from .compression import TextCompressor
+            self._set_compressed_columns(TextCompressor(dictionary))
+
+        if read_optimized:
+            return
+        elif formatted:
             if check_version:
                 self.check_version()
         elif init:
@@ -594,15 +1266,120 @@ class Database:
         return self.settings.version
 
     def init(self):
+        if not self.tables:
+            self.execute(f"pragma auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
         self.users.create(exists_ignore=True)
         self.submissions.create(exists_ignore=True)
         self.journals.create(exists_ignore=True)
         self.comments.create(exists_ignore=True)
         self.settings.create(exists_ignore=True)
         self.history.create(exists_ignore=True)
+        self.create_indexes()
+
+    def create_indexes(self):
+        for table, expressions in search_indexes.items():
+            for expression in expressions:
+                self.execute(f"create index if not exists {table}_{expression.split()[0]} on {table} ({expression})")
+
+    def _set_date_columns(self, epoch: bool):
+        for table in (self.submissions, self.journals, self.comments, self.history, self.users.stats):
+            column, unit, _ = epoch_date_columns[table.name]
+            table.date_unit = unit if epoch else None
+            table._columns = [(Column(c.name, c.type, c.sql_type, c.not_null, c.unique, c.key, c._check, c.default,
+                                      epoch_formatter(unit), epoch_parser(unit)) if epoch else column)
+                              if c.name == column.name else c for c in table.columns]
+
+    # Dates are converted in place, the declared type of the columns has numeric affinity so both formats can be stored
+    def convert_dates(self, epoch: bool = True):
+        if epoch == self.settings.epoch_dates:
+            return
+        with self.transaction():
+            if stats := self.users.has_stats:
+                self.users.drop_stats()
+            for table_name, (column, unit, text_format) in epoch_date_columns.items():
+                if table_name not in self:
+                    continue
+                name: str = column.name
+                per_second: int = timedelta(seconds=1) // unit
+                if epoch:
+                    fraction: str = f" * {per_second} + cast(substr({name}, 21, 6) as integer)" \
+                        if per_second > 1 else ""
+                    self.execute(f"""UPDATE {table_name} SET {name} = cast(strftime('%s', {name}) as integer){fraction}
+                                 WHERE typeof({name}) = 'text'""")
+                else:
+                    fraction: str = f" / {per_second}, 'unixepoch') || printf('.%06d', {name} % {per_second}" \
+                        if per_second > 1 else ", 'unixepoch'"
+                    self.execute(f"""UPDATE {table_name} SET {name} = strftime('{text_format}', {name}{fraction})
+                                 WHERE typeof({name}) = 'integer'""")
+            self.settings.epoch_dates = epoch
+            self._set_date_columns(epoch)
+            if stats:
+                self.users.rebuild_stats()
+            self.create_indexes()
+
+    def _set_compressed_columns(self, compressor: 'TextCompressor | None'):
+        if compressor is not None:
+            from .compression import CompressedColumn
+            self.connection.create_function("decompress", 1, compressor.decompress, deterministic=True)
+        for table in (self.users, self.submissions, self.journals, self.comments):
+            columns: dict[str, Column] = {c.name: c for c in compressed_text_columns[table.name]}
+            table._columns = [(c if compressor is None else CompressedColumn(c, compressor))
+                              if (c := columns.get(c_.name)) else c_ for c_ in table.columns]
+
+    # Compressed values are blobs, the declared type of the columns has text affinity so both formats can be stored
+    def compress_text(self, enabled: bool = True, *, dictionary: bytes = None, level: int = 6, sample_size: int = 2000,
+                      batch_size: int = 1000, workers: int = None) -> int:
+        from concurrent.futures import ThreadPoolExecutor
+        from .compression import TextCompressor
+        from .compression import train_dictionary
+
+        if not enabled and self.settings.compression_dictionary is None:
+            return 0
+        total: int = 0
+        tables: list[Table] = [t for t in (self.users, self.submissions, self.journals, self.comments) if t in self]
+        with self.transaction(batch_rows=batch_size) as transaction:
+            if not enabled:
+                for table in tables:
+                    for column in compressed_text_columns[table.name]:
+                        total += self.execute(f"UPDATE {table.name} SET {column.name} = decompress({column.name}) "
+                                              f"WHERE typeof({column.name}) = 'blob'").rowcount
+                self.settings.compression_dictionary = None
+                self._set_compressed_columns(None)
+            else:
+                if (dictionary := dictionary or self.settings.compression_dictionary) is None:
+                    dictionary = train_dictionary(
+                        value for table in tables for column in compressed_text_columns[table.name]
+                        for [value] in self.execute(f"SELECT {column.name} FROM {table.name} "
+                                                    f"WHERE typeof({column.name}) = 'text' "
+                                                    f"ORDER BY random() LIMIT {sample_size}")) or b" "
+                    self.settings.compression_dictionary = dictionary
+                compressor: TextCompressor = TextCompressor(dictionary, level=level)
+                self._set_compressed_columns(compressor)
+                with ThreadPoolExecutor(workers) as executor:
+                    for table in tables:
+                        for column in compressed_text_columns[table.name]:
+                            last: int = 0
+                            while rows := self.execute(
+                                    f"""SELECT ROWID, {column.name} FROM {table.name}
+                                    WHERE ROWID > ? AND typeof({column.name}) = 'text'
+                                    AND length({column.name}) >= {compressor.min_size}
+                                    ORDER BY ROWID LIMIT {batch_size}""", [last]).fetchall():
+                                last = rows[-1][0]
+                                values: list[str | bytes] = [v for part in executor.map(
+                                    lambda part: [compressor.compress(v) for _, v in part],
+                                    [rows[n:n + 64] for n in range(0, len(rows), 64)]) for v in part]
+                                self.connection.executemany(
+                                    f"UPDATE {table.name} SET {column.name} = ? WHERE ROWID = ?",
+                                    [(v, rowid) for v, (rowid, old) in zip(values, rows) if v is not old])
+                                total += len(rows)
+                                transaction.tick(len(rows))
+            for table in tables:
+                if table.search is not None and table.search.is_enabled:
+                    table.search.populate(batch_size)
+        return total
 
     def check_connection(self: Type["Database"] | str | PathLike | Path, raise_for_error: bool = True, limit: int = 0
-                         ) -> list[Process]:
+                         ) -> list["Process"]:
         return find_connections(self.path if isinstance(self, Database) else Path(self), raise_for_error, limit)
 
     def check_version(self, raise_for_error: bool = True) -> VersionError | None:
@@ -612,33 +1389,93 @@ class Database:
         return err
 
     def execute(self, sql: str, parameters: Iterable = None) -> SQLCursor:
+        if self.instrumentation.enabled:
+            return self.instrumentation.execute(sql, parameters or [])
         return self.connection.execute(sql, parameters or [])
 
     def commit(self):
+        self.history.flush()
         self.connection.commit()
         self.committed_changes = self.total_changes
 
     def rollback(self):
+        self.rollbacks += 1
         self.execute("ROLLBACK")
 
+    def transaction(self, *, batch_rows: int = 0, batch_seconds: float = 0) -> Transaction:
+        return Transaction(self, batch_rows=batch_rows, batch_seconds=batch_seconds)
+
     def reset(self, *, init: bool = False, check_connections: bool = True, check_version: bool = True,
               read_only: bool = None, autocommit: bool = None):
+        autocommit = self.autocommit if autocommit is None else autocommit
         self.close()
         self.connection = None
         self.__init__(self.path, init=init, check_connections=check_connections, check_version=check_version,
-                      read_only=self.read_only if read_only is None else read_only,
-                      autocommit=self.autocommit if autocommit is None else autocommit)
+                      read_only=(self.read_only and not self.read_optimized) if read_only is None else read_only,
+                      autocommit=autocommit, check_same_thread=self.check_same_thread,
+                      read_optimized=self.read_optimized, immutable=self.immutable if self.read_optimized else None)
 
     def upgrade(self, *, check_connections: bool = True, read_only: bool = None, autocommit: bool = None):
+        from .update import update_database
+
         self.connection = update_database(self.connection, __version__)
         self.reset(check_connections=check_connections, check_version=False,
                    read_only=self.read_only if read_only is None else read_only,
                    autocommit=self.autocommit if autocommit is None else autocommit)
+        if not self.read_only:
+            self.create_indexes()
 
     def merge(self, db_b: 'Database', *cursors: Cursor, replace: bool = True, exist_ok: bool = True):
         copy_cursors(self, cursors or [db_b.users.select(), db_b.submissions.select(), db_b.journals.select()],
                      replace=replace, exist_ok=exist_ok)
 
+    def sync(self, db_b: 'Database', since: int = None, *, batch_size: int = 500) -> int:
+        if db_b.changes not in db_b:
+            raise DatabaseError("Source database does not have a change log.")
+
+        sync_setting: str = f"SYNC:{db_b.path}"
+        since = int(self.settings[sync_setting] or 0) if since is None else since
+        if since < db_b.changes.pruned_seq:
+            raise DatabaseError(f"Changes after {since} have been pruned from the source database, use merge instead.")
+
+        last_seq: int = db_b.changes.last_seq
+        with self.transaction():
+            for table_name, keys in db_b.changes.changed_keys(since, last_seq).items():
+                if table_name not in change_log_tables:
+                    continue
+                table_src: Table = db_b.get_table(table_name)
+                table_dest: Table = self.get_table(table_name)
+                key_names: list[str] = [k.name for k in table_src.keys]
+                for n in range(0, len(keys), batch_size):
+                    query: Selector = {OR: [{AND: [{EQ: {k: v}} for k, v in zip(key_names, key)]}
+                                            for key in keys[n:n + batch_size]]}
+                    existing: set[tuple] = set(table_src.select(query, key_names).cursor)
+                    if deleted := [k for k in keys[n:n + batch_size] if k not in existing]:
+                        table_dest.delete({OR: [{AND: [{EQ: {k: v}} for k, v in zip(key_names, key)]}
+                                                for key in deleted]})
+                    if existing:
+                        copy_cursors(self, [table_src.select(query)], replace=True, exist_ok=True)
+
+            self.settings[sync_setting] = str(last_seq)
+        return last_seq
+
+    def get_table(self, name: str) -> Table:
+        return next((t for t in (self.users, self.submissions, self.journals, self.comments, self.settings,
+                                 self.history, self.changes, self.users.stats, self.users.search,
+                                 self.submissions.thumbnails,
+                                 self.submissions.search, self.journals.search) if t.name.lower() == name.lower()),
+                    self[name])
+
+    def bulk_import(self, source: str | PathLike | Path, table: str | Table, *, format_: str = None,
+                    batch_size: int = 5000, replace: bool = False, exist_ok: bool = False, resume: bool = True,
+                    drop_indexes: bool = True) -> "ImportStats":
+        from .bulk import bulk_import
+
+        if isinstance(table, str):
+            table = self.get_table(table)
+        return bulk_import(self, source, table, format_=format_, batch_size=batch_size, replace=replace,
+                           exist_ok=exist_ok, resume=resume, drop_indexes=drop_indexes)
+
     def copy(self, db_b: 'Database', *cursors: Cursor, replace: bool = True, exist_ok: bool = True):
         copy_cursors(db_b, cursors or [self.users.select(), self.submissions.select(), self.journals.select()],
                      replace=replace, exist_ok=exist_ok)
@@ -659,4 +1496,6 @@ class Database:
             backup_file.with_suffix(".tmp").unlink(missing_ok=True)
 
     def close(self):
+        if self.history.buffer:
+            self.history.flush()
         self.connection.close()
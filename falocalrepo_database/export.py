@@ -0,0 +1,268 @@
+from array import array
+from csv import writer as csv_writer
+from datetime import datetime
+from json import dumps
+from json import loads
+from pathlib import Path
+from sqlite3 import Cursor as SQLCursor
+from struct import Struct
+from time import perf_counter
+from types import GenericAlias
+from typing import Any
+from typing import BinaryIO
+from typing import Callable
+from typing import Generator
+from typing import Iterable
+from typing import Sequence
+from typing import get_origin
+
+from .column import Column
+from .compression import is_compressed_column
+from .types import Value
+
+__all__ = [
+    "FORMAT_JSONL",
+    "FORMAT_CSV",
+    "FORMAT_COLUMNAR",
+    "ExportStats",
+    "export_cursor",
+    "read_columnar",
+]
+
+FORMAT_JSONL: str = "jsonl"
+FORMAT_CSV: str = "csv"
+FORMAT_COLUMNAR: str = "columnar"
+
+_suffixes: dict[str, str] = {
+    ".jsonl": FORMAT_JSONL,
+    ".ndjson": FORMAT_JSONL,
+    ".csv": FORMAT_CSV,
+    ".falc": FORMAT_COLUMNAR,
+    ".columnar": FORMAT_COLUMNAR,
+}
+
+_columnar_magic: bytes = b"FALCOL01"
+_uint32: Struct = Struct("<I")
+_uint64: Struct = Struct("<Q")
+
+
+class ExportStats:
+    def __init__(self, path: Path, format_: str, rows: int, size: int, seconds: float):
+        self.path: Path = path
+        self.format: str = format_
+        self.rows: int = rows
+        self.size: int = size
+        self.seconds: float = seconds
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}({str(self.path)!r}, format={self.format!r}, rows={self.rows}, "
+                f"size={self.size}, seconds={self.seconds:.3f})")
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.size / self.seconds if self.seconds else float(self.size)
+
+
+def is_list_column(column: Column) -> bool:
+    return (get_origin(column.type) if type(column.type) is GenericAlias else column.type) in (list, tuple, set)
+
+
+def guess_format(path: Path) -> str:
+    if (format_ := _suffixes.get(path.suffix.lower())) is None:
+        raise ValueError(f"Cannot guess format from {path.name!r}")
+    return format_
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, set):
+        return sorted(obj)
+    elif isinstance(obj, tuple):
+        return list(obj)
+    elif isinstance(obj, datetime):
+        return obj.isoformat()
+    else:
+        return str(obj)
+
+
+def _csv_value(value: Any) -> Value:
+    if isinstance(value, (list, tuple, set, dict)):
+        return dumps(value, default=_json_default, ensure_ascii=False)
+    elif isinstance(value, datetime):
+        return value.isoformat()
+    else:
+        return value
+
+
+# Dates are exported as ISO 8601 text whatever their storage format, dates stored as integers are decoded and formatted
+def _date_text(column: Column) -> Callable[[Sequence[Value]], list]:
+    return lambda values: [column.from_entry(v).isoformat() if type(v) is int else v for v in values]
+
+
+def _chunk_decoder(columns: list[Column], decode: bool, lists: bool = True
+                   ) -> Callable[[list[tuple]], Iterable[tuple]] | None:
+    decoders: list[Callable[[Sequence[Value]], list] | None] = [
+        c.from_entries if decode or (lists and is_list_column(c)) or is_compressed_column(c) else
+        _date_text(c) if c.sql_type == "datetime" else None
+        for c in columns
+    ]
+
+    if not any(decoders):
+        return None
+
+    return lambda chunk: zip(*(d(values) if d else values for d, values in zip(decoders, zip(*chunk))))
+
+
+def _chunks(cursor: SQLCursor, chunk_size: int) -> Generator[list[tuple], None, None]:
+    while rows := cursor.fetchmany(chunk_size):
+        yield rows
+
+
+def _export_jsonl(file: BinaryIO, cursor: SQLCursor, columns: list[Column], chunk_size: int, decode: bool) -> int:
+    names: list[str] = [c.name for c in columns]
+    decoder: Callable[[list[tuple]], Iterable[tuple]] | None = _chunk_decoder(columns, decode)
+    rows: int = 0
+    for chunk in _chunks(cursor, chunk_size):
+        file.write("".join(
+            dumps(dict(zip(names, row)), default=_json_default, ensure_ascii=False) + "\n"
+            for row in (decoder(chunk) if decoder else chunk)
+        ).encode())
+        rows += len(chunk)
+    return rows
+
+
+def _export_csv(file: BinaryIO, cursor: SQLCursor, columns: list[Column], chunk_size: int, decode: bool) -> int:
+    from io import TextIOWrapper
+
+    text_file: TextIOWrapper = TextIOWrapper(file, encoding="utf-8", newline="")
+    writer = csv_writer(text_file)
+    writer.writerow([c.name for c in columns])
+    decoder: Callable[[list[tuple]], Iterable[tuple]] | None = _chunk_decoder(columns, decode, False)
+    rows: int = 0
+    for chunk in _chunks(cursor, chunk_size):
+        writer.writerows(chunk if decoder is None else (list(map(_csv_value, row)) for row in decoder(chunk)))
+        rows += len(chunk)
+    text_file.flush()
+    text_file.detach()
+    return rows
+
+
+def _pack_strings(values: list[str | None]) -> bytes:
+    offsets: array = array("q", [0])
+    blob: bytearray = bytearray()
+    for value in values:
+        blob += (value or "").encode()
+        offsets.append(len(blob))
+    return offsets.tobytes() + bytes(blob)
+
+
+def _pack_column(kind: str, values: list) -> bytes:
+    nulls: bytes = bytes(v is None for v in values)
+    payload: bytes
+    if kind == "i":
+        payload = array("q", [0 if v is None else int(v) for v in values]).tobytes()
+    elif kind == "f":
+        payload = array("d", [0. if v is None else float(v) for v in values]).tobytes()
+    elif kind == "l":
+        list_offsets: array = array("q", [0])
+        items: list[str] = []
+        for value in values:
+            items.extend(sorted(value) if isinstance(value, set) else value or [])
+            list_offsets.append(len(items))
+        payload = list_offsets.tobytes() + _pack_strings(items)
+    else:
+        payload = _pack_strings(values)
+    return nulls + _uint64.pack(len(payload)) + payload
+
+
+def _column_kind(column: Column) -> str:
+    if is_list_column(column):
+        return "l"
+    elif column.sql_type in ("integer", "boolean"):
+        return "i"
+    elif column.sql_type == "real":
+        return "f"
+    else:
+        return "s"
+
+
+def _export_columnar(file: BinaryIO, cursor: SQLCursor, columns: list[Column], chunk_size: int, decode: bool
+                     ) -> int:
+    kinds: list[str] = [_column_kind(c) for c in columns]
+    decoders: list[Callable[[Sequence[Value]], list] | None] = [
+        c.from_entries if k == "l" or is_compressed_column(c) else _date_text(c) if c.sql_type == "datetime" else None
+        for c, k in zip(columns, kinds)
+    ]
+    header: bytes = dumps([{"name": c.name, "kind": k, "type": c.sql_type} for c, k in zip(columns, kinds)]).encode()
+    file.write(_columnar_magic + _uint32.pack(len(header)) + header)
+    rows: int = 0
+    for chunk in _chunks(cursor, chunk_size):
+        file.write(_uint32.pack(len(chunk)))
+        for n, (kind, decoder) in enumerate(zip(kinds, decoders)):
+            values: list = [row[n] for row in chunk]
+            file.write(_pack_column(kind, decoder(values) if decoder else values))
+        rows += len(chunk)
+    return rows
+
+
+def export_cursor(path: str | Path, cursor: SQLCursor, columns: list[Column], *, format_: str = None,
+                  chunk_size: int = 10000, decode: bool = False) -> ExportStats:
+    path = Path(path)
+    format_ = format_ or guess_format(path)
+    exporter: Callable[[BinaryIO, SQLCursor, list[Column], int, bool], int]
+
+    if format_ == FORMAT_JSONL:
+        exporter = _export_jsonl
+    elif format_ == FORMAT_CSV:
+        exporter = _export_csv
+    elif format_ == FORMAT_COLUMNAR:
+        exporter = _export_columnar
+    else:
+        raise ValueError(f"Unknown export format {format_!r}")
+
+    start: float = perf_counter()
+    with path.open("wb") as file:
+        rows: int = exporter(file, cursor, columns, chunk_size, decode)
+    return ExportStats(path, format_, rows, path.stat().st_size, perf_counter() - start)
+
+
+def _unpack_strings(data: memoryview, count: int) -> tuple[list[str], int]:
+    offsets: array = array("q")
+    offsets.frombytes(data[:(count + 1) * 8])
+    blob: bytes = bytes(data[(count + 1) * 8:(count + 1) * 8 + offsets[-1]])
+    return [blob[offsets[i]:offsets[i + 1]].decode() for i in range(count)], (count + 1) * 8 + offsets[-1]
+
+
+def _unpack_column(kind: str, data: memoryview, count: int) -> list:
+    values: list
+    if kind in ("i", "f"):
+        numbers: array = array("q" if kind == "i" else "d")
+        numbers.frombytes(data)
+        values = numbers.tolist()
+    elif kind == "l":
+        list_offsets: array = array("q")
+        list_offsets.frombytes(data[:(count + 1) * 8])
+        items, _ = _unpack_strings(data[(count + 1) * 8:], list_offsets[-1])
+        values = [items[list_offsets[i]:list_offsets[i + 1]] for i in range(count)]
+    else:
+        values, _ = _unpack_strings(data, count)
+    return values
+
+
+def read_columnar(path: str | Path) -> Generator[dict[str, list], None, None]:
+    with Path(path).open("rb") as file:
+        if file.read(len(_columnar_magic)) != _columnar_magic:
+            raise ValueError(f"{path} is not a columnar export file")
+        header: list[dict] = loads(file.read(_uint32.unpack(file.read(_uint32.size))[0]))
+        while count_bytes := file.read(_uint32.size):
+            count: int = _uint32.unpack(count_bytes)[0]
+            chunk: dict[str, list] = {}
+            for column in header:
+                nulls: bytes = file.read(count)
+                values: list = _unpack_column(column["kind"], memoryview(file.read(
+                    _uint64.unpack(file.read(_uint64.size))[0])), count)
+                chunk[column["name"]] = [None if null else v for v, null in zip(values, nulls)]
+            yield chunk
@@ -0,0 +1,198 @@
+from bisect import bisect_left
+from collections import deque
+from re import compile as re_compile
+from re import Pattern
+from sqlite3 import Cursor as SQLCursor
+from sqlite3 import Error as SQLError
+from threading import Lock
+from time import perf_counter
+from typing import Any
+from typing import Callable
+from typing import Sequence
+from typing import TYPE_CHECKING
+from weakref import finalize
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__ = [
+    "Instrumentation",
+    "QueryEvent",
+    "QueryStats",
+    "normalize_sql",
+]
+
+_literals: Pattern = re_compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_lists: Pattern = re_compile(r"\?(?:\s*,\s*\?)+")
+_spaces: Pattern = re_compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    return _lists.sub("?, ...", _literals.sub("?", _spaces.sub(" ", sql).strip()))
+
+
+class QueryEvent:
+    def __init__(self, sql: str, parameters: Sequence[Any] | dict[str, Any], normalized: str):
+        self.sql: str = sql
+        self.parameters: Sequence[Any] | dict[str, Any] = parameters
+        self.normalized: str = normalized
+        self.seconds: float = 0.
+        self.rows: int = 0
+        self.plan: list[str] | None = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.normalized!r}, seconds={self.seconds:.6f}, rows={self.rows})"
+
+
+class QueryStats:
+    buckets: tuple[float, ...] = (.0001, .001, .01, .1, 1., 10.)
+
+    def __init__(self, sql: str):
+        self.sql: str = sql
+        self.count: int = 0
+        self.rows: int = 0
+        self.seconds: float = 0.
+        self.max_seconds: float = 0.
+        self.histogram: list[int] = [0] * (len(self.buckets) + 1)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}({self.sql!r}, count={self.count}, rows={self.rows}, "
+                f"seconds={self.seconds:.6f}, max_seconds={self.max_seconds:.6f})")
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.count if self.count else 0.
+
+    def add(self, event: QueryEvent):
+        self.count += 1
+        self.rows += event.rows
+        self.seconds += event.seconds
+        self.max_seconds = max(self.max_seconds, event.seconds)
+        self.histogram[bisect_left(self.buckets, event.seconds)] += 1
+
+
+# Rows are counted and fetch time is added to the event as they are read, the event is recorded once the cursor is
+# exhausted or closed, or when it is garbage collected if it is dropped before that
+class _InstrumentedCursor(SQLCursor):
+    event: QueryEvent | None = None
+    recorder: finalize | None = None
+
+    def _fetched(self, start: float, rows: int, done: bool):
+        if (event := self.event) is None:
+            return
+        event.seconds += perf_counter() - start
+        event.rows += rows
+        if done:
+            self.event = None
+            self.recorder()
+
+    def __next__(self):
+        start: float = perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+    def fetchone(self):
+        start: float = perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size: int = None):
+        start: float = perf_counter()
+        size = self.arraysize if size is None else size
+        rows: list = super().fetchmany(size)
+        self._fetched(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start: float = perf_counter()
+        rows: list = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def close(self):
+        self._fetched(perf_counter(), 0, True)
+        super().close()
+
+
+class Instrumentation:
+    def __init__(self, database: 'Database'):
+        self.database: 'Database' = database
+        self.enabled: bool = False
+        self.slow_threshold: float | None = None
+        self.pre_execute: list[Callable[[str, Sequence[Any] | dict[str, Any]], None]] = []
+        self.post_execute: list[Callable[[QueryEvent], None]] = []
+        self.queries: dict[str, QueryStats] = {}
+        self.slow_queries: deque[QueryEvent] = deque(maxlen=100)
+        self.counters: dict[str, int] = {}
+        self._lock: Lock = Lock()
+
+    def enable(self, *, slow_threshold: float = None, slow_log_size: int = 100):
+        self.enabled = True
+        self.slow_threshold = slow_threshold
+        if slow_log_size != self.slow_queries.maxlen:
+            self.slow_queries = deque(self.slow_queries, maxlen=slow_log_size)
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self.queries.clear()
+            self.slow_queries.clear()
+            self.counters.clear()
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def explain(self, sql: str, parameters: Sequence[Any] | dict[str, Any] = None) -> list[str]:
+        try:
+            return [detail for *_, detail in
+                    self.database.connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters or [])]
+        except SQLError:
+            return []
+
+    def execute(self, sql: str, parameters: Sequence[Any] | dict[str, Any]) -> SQLCursor:
+        for hook in self.pre_execute:
+            hook(sql, parameters)
+
+        cursor: _InstrumentedCursor = self.database.connection.cursor(_InstrumentedCursor)
+        event: QueryEvent = QueryEvent(sql, parameters, normalize_sql(sql))
+        start: float = perf_counter()
+        cursor.execute(sql, parameters)
+        event.seconds = perf_counter() - start
+
+        if cursor.description is None:
+            event.rows = max(cursor.rowcount, 0)
+            self.record(event)
+        else:
+            cursor.event, cursor.recorder = event, finalize(cursor, self.record, event)
+            cursor.recorder.atexit = False
+
+        return cursor
+
+    def record(self, event: QueryEvent):
+        if self.slow_threshold is not None and event.seconds >= self.slow_threshold:
+            event.plan = self.explain(event.sql, event.parameters)
+        with self._lock:
+            if (stats := self.queries.get(event.normalized)) is None:
+                stats = self.queries[event.normalized] = QueryStats(event.normalized)
+            stats.add(event)
+            if event.plan is not None:
+                self.slow_queries.append(event)
+        for hook in self.post_execute:
+            hook(event)
+
+    def slowest(self, limit: int = 10) -> list[QueryStats]:
+        return sorted(self.queries.values(), key=lambda s: s.seconds, reverse=True)[:limit]
+
+    def full_scans(self) -> list[QueryEvent]:
+        return [e for e in self.slow_queries if any(p.startswith("SCAN ") for p in e.plan)]
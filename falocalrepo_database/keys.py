@@ -0,0 +1,200 @@
+from abc import ABC
+from abc import abstractmethod
+from hashlib import blake2b
+from math import ceil
+from math import log
+from pathlib import Path
+from struct import Struct
+from typing import Iterable
+from typing import TYPE_CHECKING
+
+from .types import Value
+
+if TYPE_CHECKING:
+    from .database import Table
+
+__all__ = [
+    "KeyFilter",
+    "IntegerKeySet",
+    "BloomFilter",
+    "table_stamp",
+    "build_key_filter",
+    "load_key_filter",
+]
+
+_magic: bytes = b"FAKF"
+# Magic, kind, number of hashes, number of keys, and the table stamp: rows, max ROWID, sum of ROWIDs
+_header: Struct = Struct("<4sBBxxQqqd")
+_max_bitmap_key: int = 1 << 32
+
+
+def _integer_key(key: Value) -> int | None:
+    if isinstance(key, str):
+        try:
+            key = float(key) if "." in key or "e" in key.lower() else int(key)
+        except ValueError:
+            return None
+    if isinstance(key, float):
+        return int(key) if key.is_integer() else None
+    return key if isinstance(key, int) else None
+
+
+class KeyFilter(ABC):
+    exact: bool = True
+    kind: int = -1
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def __contains__(self, key: Value) -> bool:
+        ...
+
+    @abstractmethod
+    def add(self, key: Value):
+        ...
+
+    @abstractmethod
+    def discard(self, key: Value):
+        ...
+
+    def update(self, keys: Iterable[Value]):
+        for key in keys:
+            self.add(key)
+
+    @abstractmethod
+    def _payload(self) -> tuple[int, bytes]:
+        ...
+
+    def save(self, path: Path, stamp: tuple[int, int, float]):
+        hashes, payload = self._payload()
+        with (partial := path.with_name(f".{path.name}")).open("wb") as file:
+            file.write(_header.pack(_magic, self.kind, hashes, len(self), *stamp))
+            file.write(payload)
+        partial.replace(path)
+
+
+# Bitmap of non-negative integer keys, keys that are negative or too large for the bitmap are kept in a set
+class IntegerKeySet(KeyFilter):
+    kind: int = 0
+
+    def __init__(self, bits: bytearray = None, count: int = 0):
+        self.bits: bytearray = bits if bits is not None else bytearray()
+        self.count: int = count
+        self.others: set[int] = set()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(keys={self.count}, bytes={len(self.bits)})"
+
+    def __len__(self) -> int:
+        return self.count
+
+    # Text and real keys are compared like SQLite compares them with an integer column
+    def __contains__(self, key: int) -> bool:
+        if type(key) is not int:
+            key = _integer_key(key)
+        try:
+            return bool(self.bits[key >> 3] & (1 << (key & 7))) if key >= 0 else key in self.others
+        except IndexError:
+            return key in self.others
+        except TypeError:
+            return False
+
+    def add(self, key: int):
+        if not 0 <= key < _max_bitmap_key:
+            self.count += key not in self.others
+            self.others.add(key)
+            return
+        if (index := key >> 3) >= len(self.bits):
+            self.bits.extend(bytes(max(index + 1 - len(self.bits), len(self.bits) // 2)))
+        if not self.bits[index] & (bit := 1 << (key & 7)):
+            self.bits[index] |= bit
+            self.count += 1
+
+    def discard(self, key: int):
+        if key in self.others:
+            self.others.discard(key)
+            self.count -= 1
+        elif 0 <= key and key in self:
+            self.bits[key >> 3] &= ~(1 << (key & 7)) & 0xFF
+            self.count -= 1
+
+    def _payload(self) -> tuple[int, bytes]:
+        return 0, bytes(self.bits)
+
+
+# Positive answers may be false, negative answers are always correct; removed keys stay in the filter
+class BloomFilter(KeyFilter):
+    exact: bool = False
+    kind: int = 1
+
+    def __init__(self, capacity: int, error_rate: float = .01, *, bits: bytearray = None, hashes: int = None,
+                 count: int = 0):
+        size: int = max(ceil(-capacity * log(error_rate) / (log(2) ** 2)), 64)
+        self.bits: bytearray = bits if bits is not None else bytearray(ceil(size / 8))
+        self.size: int = len(self.bits) * 8
+        self.hashes: int = hashes or max(round(self.size / max(capacity, 1) * log(2)), 1)
+        self.count: int = count
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(keys={self.count}, bytes={len(self.bits)}, hashes={self.hashes})"
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _positions(self, key: Value) -> Iterable[int]:
+        digest: bytes = blake2b(str(key).encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def __contains__(self, key: Value) -> bool:
+        bits: bytearray = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: Value):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def discard(self, key: Value):
+        pass
+
+    def _payload(self) -> tuple[int, bytes]:
+        return self.hashes, bytes(self.bits)
+
+
+def table_stamp(table: 'Table') -> tuple[int, int, float]:
+    rows, last, total = table.database.execute(
+        f"SELECT count(*), coalesce(max(ROWID), 0), total(ROWID) FROM {table.name}").fetchone()
+    return rows, last, total
+
+
+def build_key_filter(table: 'Table', *, error_rate: float = .01) -> KeyFilter:
+    if len(table.keys) != 1:
+        raise ValueError(f"Table {table.name} does not have a single key column")
+    key_filter: KeyFilter
+    if table.key.sql_type == "integer":
+        key_filter = IntegerKeySet()
+    else:
+        rows: int = table.database.execute(f"SELECT count(*) FROM {table.name}").fetchone()[0]
+        key_filter = BloomFilter(max(rows * 2, 1024), error_rate)
+    key_filter.update(k for [k] in table.database.execute(f"SELECT {table.key.name} FROM {table.name}"))
+    return key_filter
+
+
+def load_key_filter(table: 'Table', path: Path) -> KeyFilter | None:
+    if not path.is_file():
+        return None
+    with path.open("rb") as file:
+        if len(header := file.read(_header.size)) < _header.size:
+            return None
+        magic, kind, hashes, count, *stamp = _header.unpack(header)
+        if magic != _magic or tuple(stamp) != table_stamp(table):
+            return None
+        bits: bytearray = bytearray(file.read())
+    if kind == IntegerKeySet.kind and table.key.sql_type == "integer":
+        return IntegerKeySet(bits, count) if int.from_bytes(bits, "little").bit_count() == count else None
+    elif kind == BloomFilter.kind and table.key.sql_type != "integer":
+        return BloomFilter(1, bits=bits, hashes=hashes, count=count)
+    return None
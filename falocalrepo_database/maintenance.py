@@ -0,0 +1,127 @@
+from sqlite3 import DatabaseError
+from sqlite3 import OperationalError
+from time import monotonic
+from typing import Any
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__ = [
+    "AUTO_VACUUM_NONE",
+    "AUTO_VACUUM_FULL",
+    "AUTO_VACUUM_INCREMENTAL",
+    "Maintenance",
+]
+
+AUTO_VACUUM_NONE: int = 0
+AUTO_VACUUM_FULL: int = 1
+AUTO_VACUUM_INCREMENTAL: int = 2
+
+
+# Jobs commit after each bounded step so that other connections can write between them, the budget of each job is
+# checked between steps so a job may exceed it by at most one step
+class Maintenance:
+    vacuum_step_pages: int = 256
+    analysis_limit: int = 400
+
+    def __init__(self, database: 'Database'):
+        self.database: 'Database' = database
+
+    def _pragma(self, pragma: str) -> Any:
+        return self.database.connection.execute(f"pragma {pragma}").fetchone()[0]
+
+    def _check_writable(self):
+        if self.database.read_only:
+            raise DatabaseError("Cannot run maintenance on a read-only database.")
+        elif self.database.connection.in_transaction:
+            raise DatabaseError("Cannot run maintenance with uncommitted changes.")
+
+    @property
+    def auto_vacuum(self) -> int:
+        return self._pragma("auto_vacuum")
+
+    @property
+    def free_pages(self) -> int:
+        return self._pragma("freelist_count")
+
+    @property
+    def is_wal(self) -> bool:
+        return self._pragma("journal_mode").lower() == "wal"
+
+    # Changing auto_vacuum on a database that already has tables only takes effect after a full VACUUM
+    def enable_incremental_vacuum(self) -> bool:
+        self._check_writable()
+        if self.auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+            return False
+        self.database.connection.execute(f"pragma auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        self.database.connection.execute("vacuum")
+        return True
+
+    def incremental_vacuum(self, seconds: float = 1., pages: int = None) -> int:
+        self._check_writable()
+        if self.auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+            return 0
+        deadline: float = monotonic() + seconds
+        step: int = pages or self.vacuum_step_pages
+        freed: int = 0
+        while (free := self.free_pages) and monotonic() < deadline:
+            self.database.connection.execute(f"pragma incremental_vacuum({step})").fetchall()
+            self.database.commit()
+            freed += free - self.free_pages
+        return freed
+
+    def optimize(self, analysis_limit: int = None) -> list[str]:
+        self._check_writable()
+        self.database.connection.execute(f"pragma analysis_limit = {analysis_limit or self.analysis_limit}")
+        statements: list[str] = [s for [s] in self.database.connection.execute("pragma optimize(0x03)")]
+        self.database.connection.execute("pragma optimize")
+        self.database.commit()
+        return statements
+
+    def checkpoint(self, mode: str = "PASSIVE", seconds: float = 0.) -> tuple[int, int, int] | None:
+        if mode.upper() not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Unknown checkpoint mode {mode!r}")
+        elif not self.is_wal:
+            return None
+        timeout: int = self._pragma("busy_timeout")
+        self.database.connection.execute(f"pragma busy_timeout = {int(seconds * 1000)}")
+        try:
+            busy, log, checkpointed = self.database.connection.execute(
+                f"pragma wal_checkpoint({mode.upper()})").fetchone()
+        finally:
+            self.database.connection.execute(f"pragma busy_timeout = {timeout}")
+        return busy, log, checkpointed
+
+    def quick_check(self, seconds: float = 10., max_errors: int = 100) -> list[str] | None:
+        deadline: float = monotonic() + seconds
+        self.database.connection.set_progress_handler(lambda: monotonic() > deadline, 1000)
+        try:
+            results: list[str] = [r for [r] in self.database.connection.execute(f"pragma quick_check({max_errors})")]
+        except OperationalError as err:
+            if monotonic() > deadline:
+                return None
+            raise err
+        finally:
+            self.database.connection.set_progress_handler(None, 0)
+        return [] if results == ["ok"] else results
+
+    def run(self, seconds: float = 5., *, vacuum: bool = True, optimize: bool = True, checkpoint: bool = True,
+            check: bool = False, history: bool = True) -> dict[str, Any]:
+        deadline: float = monotonic() + seconds
+        results: dict[str, Any] = {}
+        if history and not self.database.read_only and self.database.history.retention != (None, None):
+            self._check_writable()
+            results["history"] = self.database.history.apply_retention()
+            self.database.commit()
+        if vacuum:
+            results["incremental_vacuum"] = self.incremental_vacuum(max(deadline - monotonic(), 0))
+        if optimize and monotonic() < deadline:
+            results["optimize"] = self.optimize()
+        if checkpoint and monotonic() < deadline:
+            results["checkpoint"] = self.checkpoint("PASSIVE")
+            if results["checkpoint"] is not None and not results["checkpoint"][0] and monotonic() < deadline:
+                results["checkpoint"] = self.checkpoint("TRUNCATE", min(deadline - monotonic(), 1.))
+        if check and monotonic() < deadline:
+            results["quick_check"] = self.quick_check(deadline - monotonic())
+        return results
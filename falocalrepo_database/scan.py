@@ -0,0 +1,62 @@
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from os import cpu_count
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Generator
+from typing import Iterable
+from typing import TYPE_CHECKING
+from typing import TypeVar
+
+from .types import Value
+
+if TYPE_CHECKING:
+    from .database import Database
+    from .database import Table
+
+__all__ = [
+    "key_ranges",
+    "parallel_scan",
+]
+
+T = TypeVar("T")
+
+_database: 'Database | None' = None
+
+
+def _open_database(path: Path):
+    global _database
+    from .database import Database
+    _database = Database(path, read_only=True, check_connections=False, check_version=False)
+
+
+def _scan_range(table_name: str, columns: list[str] | None, sql: str, values: list[Value], start: int, end: int,
+                fn: Callable[[Iterable[dict[str, Value]]], T]) -> T:
+    return fn(iter(_database.get_table(table_name).select_sql(
+        "ROWID >= ? AND ROWID < ?" + (f" AND ({sql})" if sql else ""), [start, end, *values], columns)))
+
+
+def key_ranges(table: 'Table', partitions: int) -> list[tuple[int, int]]:
+    first, last = table.database.execute(f"SELECT min(ROWID), max(ROWID) FROM {table.name}").fetchone()
+    if first is None:
+        return []
+    step: int = max(-(-(last - first + 1) // partitions), 1)
+    return [(start, min(start + step, last + 1)) for start in range(first, last + 1, step)]
+
+
+def parallel_scan(table: 'Table', sql: str, values: list[Value], columns: list[str] | None,
+                  fn: Callable[[Iterable[dict[str, Value]]], T], *, workers: int = None, partitions: int = None,
+                  ordered: bool = True) -> Generator[T, None, None]:
+    workers = workers or cpu_count() or 1
+    ranges: list[tuple[int, int]] = key_ranges(table, partitions or workers * 4)
+    executor: ProcessPoolExecutor = ProcessPoolExecutor(min(workers, len(ranges)) or 1, initializer=_open_database,
+                                                        initargs=(table.database.path,))
+    try:
+        futures: list[Future[Any]] = [executor.submit(_scan_range, table.name, columns, sql, values, start, end, fn)
+                                      for start, end in ranges]
+        for future in (futures if ordered else as_completed(futures)):
+            yield future.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
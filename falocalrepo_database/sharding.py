@@ -0,0 +1,474 @@
+from abc import ABC
+from abc import abstractmethod
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import cmp_to_key
+from heapq import merge
+from itertools import chain
+from itertools import islice
+from json import dumps
+from json import loads
+from os import PathLike
+from pathlib import Path
+from re import IGNORECASE
+from re import match
+from typing import Any
+from typing import Callable
+from typing import Generator
+from typing import Iterable
+from zlib import crc32
+
+from .column import Column
+from .database import Cursor
+from .database import Database
+from .database import Table
+from .selector import AND
+from .selector import GE
+from .selector import LT
+from .selector import Selector
+from .selector import selector_to_sql
+from .tables import CommentsColumns
+from .tables import JournalsColumns
+from .tables import SubmissionsColumns
+from .types import Value
+from .util import clean_username
+
+__all__ = [
+    "ShardStrategy",
+    "IDRangeStrategy",
+    "AuthorHashStrategy",
+    "ShardedCursor",
+    "ShardedTable",
+    "ShardedSubmissionsTable",
+    "ShardedJournalsTable",
+    "ShardedCommentsTable",
+    "ShardedDatabase",
+]
+
+
+class ShardStrategy(ABC):
+    name: str = ""
+
+    @property
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def shard_for_id(self, id_: int) -> int | None:
+        return None
+
+    def shard_for_author(self, author: str) -> int | None:
+        return None
+
+    @abstractmethod
+    def to_setting(self) -> dict[str, Any]:
+        ...
+
+    @classmethod
+    def from_setting(cls, setting: dict[str, Any]) -> 'ShardStrategy':
+        if setting.get("strategy") == IDRangeStrategy.name:
+            return IDRangeStrategy(setting["bounds"])
+        elif setting.get("strategy") == AuthorHashStrategy.name:
+            return AuthorHashStrategy(setting["count"])
+        else:
+            raise ValueError(f"Unknown shard strategy {setting.get('strategy')!r}")
+
+
+class IDRangeStrategy(ShardStrategy):
+    name: str = "id"
+
+    def __init__(self, bounds: Iterable[int]):
+        self.bounds: list[int] = sorted(bounds)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.bounds})"
+
+    @property
+    def count(self) -> int:
+        return len(self.bounds) + 1
+
+    def shard_for_id(self, id_: int) -> int:
+        return bisect_right(self.bounds, int(id_))
+
+    def range(self, shard: int) -> tuple[int | None, int | None]:
+        return self.bounds[shard - 1] if shard > 0 else None, self.bounds[shard] if shard < len(self.bounds) else None
+
+    def to_setting(self) -> dict[str, Any]:
+        return {"strategy": self.name, "bounds": self.bounds}
+
+
+class AuthorHashStrategy(ShardStrategy):
+    name: str = "author"
+
+    def __init__(self, count: int):
+        assert count > 0, "count must be greater than 0"
+        self._count: int = count
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._count})"
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def shard_for_author(self, author: str) -> int:
+        return crc32(clean_username(author).encode()) % self._count
+
+    def to_setting(self) -> dict[str, Any]:
+        return {"strategy": self.name, "count": self._count}
+
+
+def _merge_key(columns: list[Column], order: list[str]) -> Callable[[tuple], Any]:
+    names: list[str] = [c.name.upper() for c in columns]
+    specs: list[tuple[int, bool]] = []
+    for elem in order:
+        if not (m := match(r"^\s*(\w+)(?:\s+(asc|desc))?\s*$", elem, IGNORECASE)) or m[1].upper() not in names:
+            raise ValueError(f"Cannot merge shards on order {elem!r}, order columns must be selected")
+        specs.append((names.index(m[1].upper()), (m[2] or "asc").lower() == "desc"))
+
+    def compare(a: tuple, b: tuple) -> int:
+        for index, desc in specs:
+            if (x := a[index]) == (y := b[index]):
+                continue
+            lt: bool = x is None or (y is not None and x < y)
+            return (1 if lt else -1) if desc else (-1 if lt else 1)
+        return 0
+
+    return cmp_to_key(compare)
+
+
+# The queries of all shards are started in parallel and their rows are merged as they are read, the count is the sum
+# of the counts of the shard cursors
+class ShardedCursor(Cursor):
+    def __init__(self, cursor: Iterable[tuple], columns: list[Column], table: Table, shard_cursors: list[Cursor], *,
+                 limit: int = 0, offset: int = 0, query: str = None, query_values: list[Any] = None):
+        super().__init__(cursor, columns, table, query=query, query_values=query_values)
+        self.shard_cursors: list[Cursor] = shard_cursors
+        self.limit: int = limit
+        self.offset: int = offset
+
+    def count(self) -> int:
+        count: int = sum(c.count() for c in self.shard_cursors)
+        return max(min(count - self.offset, self.limit), 0) if self.limit > 0 else count
+
+    def close(self):
+        for cursor in self.shard_cursors:
+            cursor.close()
+
+
+class ShardedTable(ABC):
+    def __init__(self, database: 'ShardedDatabase', name: str):
+        self.database: ShardedDatabase = database
+        self.name: str = name
+
+    @property
+    def shards(self) -> list[Table]:
+        return [db.get_table(self.name) for db in self.database.shards]
+
+    @property
+    def columns(self) -> list[Column]:
+        return self.shards[0].columns
+
+    @property
+    def key(self) -> Column:
+        return self.shards[0].key
+
+    def _fan_out(self, function: Callable[[Table], Any], shards: list[Table] = None) -> list[Any]:
+        return list(self.database.executor.map(function, shards or self.shards))
+
+    @abstractmethod
+    def shard_for_entry(self, entry: dict[str, Any]) -> Table:
+        ...
+
+    def shard_for_key(self, key: Value) -> Table | None:
+        return next((s for s, found in zip(self.shards, self._fan_out(lambda s: key in s)) if found), None)
+
+    def __len__(self) -> int:
+        return sum(self._fan_out(len))
+
+    def __contains__(self, key: Value) -> bool:
+        return self.shard_for_key(key) is not None
+
+    def __getitem__(self, key: Value) -> dict[str, Value] | None:
+        return shard[key] if (shard := self.shard_for_key(key)) is not None else None
+
+    def __setitem__(self, key: Value, entry: dict[str, Any]):
+        self.shard_for_entry(entry | {self.key.name: key})[key] = entry
+
+    def __delitem__(self, key: Value):
+        if (shard := self.shard_for_key(key)) is not None:
+            del shard[key]
+
+    def __iter__(self) -> Generator[dict[str, Value], None, None]:
+        return self.select(order=[self.key.name]).entries
+
+    def insert(self, entry: dict[str, Value], *, replace: bool = False, exists_ok: bool = False):
+        self.shard_for_entry(entry).insert(entry, replace=replace, exists_ok=exists_ok)
+
+    def select(self, query: Selector = None, columns: list[str | Column] = None, order: list[str] = None,
+               limit: int = 0, offset: int = 0) -> Cursor:
+        sql, values = selector_to_sql(query) if query else ("", None)
+        return self.select_sql(sql, values, columns, order, limit, offset)
+
+    def select_query(self, query: str, columns: list[str | Column] = None, default_field: str = None,
+                     likes: list[str] = None, aliases: dict[str, str] = None, order: list[str] = None, limit: int = 0,
+                     offset: int = 0) -> Cursor:
+        sql, values = self.shards[0].query_sql(query, default_field, likes, aliases)
+        return self.select_sql(sql, values, columns, order, limit, offset)
+
+    def select_sql(self, sql: str, values: list[Any] = None, columns: list[str | Column] = None,
+                   order: list[str] = None, limit: int = 0, offset: int = 0, *, shards: list[Table] = None
+                   ) -> Cursor:
+        cursors: list[Cursor] = self._fan_out(
+            lambda shard: shard.select_sql(sql, values, columns, order, limit + offset if limit > 0 else 0), shards)
+        columns_: list[Column] = cursors[0].columns
+        rows: Iterable[tuple] = merge(*(c.cursor for c in cursors), key=_merge_key(columns_, order)) \
+            if order and len(cursors) > 1 else chain.from_iterable(c.cursor for c in cursors)
+        if limit > 0:
+            rows = islice(rows, offset, offset + limit)
+        return ShardedCursor(iter(rows), columns_, self.shards[0], cursors, limit=limit, offset=offset, query=sql,
+                             query_values=values)
+
+    # Returns the files left behind in the source shard by the moved entries, to be deleted once the destination is
+    # committed
+    def move(self, query: Selector, destination: Table, source: Table) -> list[Path]:
+        for entry in source.select(query):
+            destination.insert(destination.format_entry(entry), replace=True)
+        source.delete(query)
+        return []
+
+
+class ShardedSubmissionsTable(ShardedTable):
+    def shard_for_entry(self, entry: dict[str, Any]) -> Table:
+        strategy: ShardStrategy = self.database.strategy
+        shard: int | None = strategy.shard_for_id(entry[SubmissionsColumns.ID.name])
+        shard = strategy.shard_for_author(entry[SubmissionsColumns.AUTHOR.name]) if shard is None else shard
+        return self.shards[shard]
+
+    def shard_for_key(self, key: Value) -> Table | None:
+        if (shard := self.database.strategy.shard_for_id(key)) is not None:
+            return self.shards[shard] if key in self.shards[shard] else None
+        return super().shard_for_key(key)
+
+    def save_submission(self, submission: dict[str, Value | list[Value]], files: list[bytes] = None,
+                        thumbnail: bytes = None, *, replace: bool = False, exist_ok: bool = False):
+        self.shard_for_entry({k.upper(): v for k, v in submission.items()}).save_submission(
+            submission, files, thumbnail, replace=replace, exist_ok=exist_ok)
+
+    def move(self, query: Selector, destination: Table, source: Table) -> list[Path]:
+        moved_files: list[Path] = []
+        for entry in source.select(query):
+            files, thumbnail = source.get_submission_files(entry[SubmissionsColumns.ID.name])
+            destination.save_submission(entry, [f.read_bytes() for f in files or []],
+                                        source.get_submission_thumbnail(entry[SubmissionsColumns.ID.name]),
+                                        replace=True)
+            moved_files.extend(f for f in [*(files or []), thumbnail] if f is not None)
+        source.delete(query)
+        return moved_files if source.files_folder.resolve() != destination.files_folder.resolve() else []
+
+    def get_submission_files(self, submission_id: int) -> tuple[list[Path] | None, Path | None]:
+        if (shard := self.shard_for_key(submission_id)) is None:
+            return None, None
+        return shard.get_submission_files(submission_id)
+
+    def get_submission_thumbnail(self, submission_id: int) -> bytes | None:
+        if (shard := self.shard_for_key(submission_id)) is None:
+            return None
+        return shard.get_submission_thumbnail(submission_id)
+
+    def _call(self, submission_id: int, method: str, *args) -> bool:
+        if (shard := self.shard_for_key(submission_id)) is None:
+            raise KeyError(f"Entry {self.key.name} = {submission_id!r} does not exist in {self.name} table.")
+        return getattr(shard, method)(submission_id, *args)
+
+    def set_filesaved(self, submission_id: int, all_files: bool | int, any_file: bool | int, thumbnail: bool | int):
+        return self._call(submission_id, "set_filesaved", all_files, any_file, thumbnail)
+
+    def set_folder(self, submission_id: int, folder: str) -> bool:
+        return self._call(submission_id, "set_folder", folder)
+
+    def set_user_update(self, submission_id: int, update: bool) -> bool:
+        return self._call(submission_id, "set_user_update", update)
+
+    def add_favorite(self, submission_id: int, user: str) -> bool:
+        return self._call(submission_id, "add_favorite", user)
+
+    def remove_favorite(self, submission_id: int, user: str) -> bool:
+        return self._call(submission_id, "remove_favorite", user)
+
+    def add_mention(self, submission_id: int, user: str) -> bool:
+        return self._call(submission_id, "add_mention", user)
+
+    def remove_mention(self, submission_id: int, user: str) -> bool:
+        return self._call(submission_id, "remove_mention", user)
+
+
+class ShardedJournalsTable(ShardedTable):
+    def shard_for_entry(self, entry: dict[str, Any]) -> Table:
+        strategy: ShardStrategy = self.database.strategy
+        shard: int | None = strategy.shard_for_id(entry[JournalsColumns.ID.name])
+        shard = strategy.shard_for_author(entry[JournalsColumns.AUTHOR.name]) if shard is None else shard
+        return self.shards[shard]
+
+    def shard_for_key(self, key: Value) -> Table | None:
+        if (shard := self.database.strategy.shard_for_id(key)) is not None:
+            return self.shards[shard] if key in self.shards[shard] else None
+        return super().shard_for_key(key)
+
+    def save_journal(self, journal: dict[str, Any], *, replace: bool = False, exist_ok: bool = False):
+        self.shard_for_entry({k.upper(): v for k, v in journal.items()}).save_journal(
+            journal, replace=replace, exist_ok=exist_ok)
+
+    def _call(self, journal_id: int, method: str, *args) -> bool:
+        if (shard := self.shard_for_key(journal_id)) is None:
+            raise KeyError(f"Entry {self.key.name} = {journal_id!r} does not exist in {self.name} table.")
+        return getattr(shard, method)(journal_id, *args)
+
+    def set_user_update(self, journal_id: int, update: bool) -> bool:
+        return self._call(journal_id, "set_user_update", update)
+
+    def add_mention(self, journal_id: int, user: str) -> bool:
+        return self._call(journal_id, "add_mention", user)
+
+    def remove_mention(self, journal_id: int, user: str) -> bool:
+        return self._call(journal_id, "remove_mention", user)
+
+
+class ShardedCommentsTable(ShardedTable):
+    # Comments are stored with their parent for ID ranges, otherwise they are spread by parent key
+    def parent_shard(self, parent_table: str, parent_id: int) -> Table:
+        if (shard := self.database.strategy.shard_for_id(parent_id)) is None:
+            shard = crc32(f"{parent_table.upper()}:{parent_id}".encode()) % len(self.shards)
+        return self.shards[shard]
+
+    def shard_for_entry(self, entry: dict[str, Any]) -> Table:
+        return self.parent_shard(entry[CommentsColumns.PARENT_TABLE.name], entry[CommentsColumns.PARENT_ID.name])
+
+    def save_comment(self, comment: dict[str, Any], *, replace: bool = False, exist_ok: bool = False):
+        self.shard_for_entry({k.upper(): v for k, v in comment.items()}).save_comment(
+            comment, replace=replace, exist_ok=exist_ok)
+
+    def select_comments(self, parent_table: str, parent_id: int) -> Cursor:
+        return self.select_sql(
+            f"{CommentsColumns.PARENT_TABLE.name} = ? and {CommentsColumns.PARENT_ID.name} = ?",
+            [parent_table, parent_id],
+            order=[f"{CommentsColumns.ID.name} ASC"],
+            shards=[self.parent_shard(parent_table, parent_id)])
+
+    def get_comments(self, parent_table: str, parent_id: int) -> list[dict]:
+        return self.select_comments(parent_table, parent_id).fetchall()
+
+    def get_comments_tree(self, parent_table: str, parent_id: int) -> list[dict]:
+        comments: list[dict] = self.get_comments(parent_table, parent_id)
+        return self.make_comments_tree([c for c in comments if c[CommentsColumns.REPLY_TO.name] is None], comments)
+
+    def make_comments_tree(self, comments: list[dict], all_comments: list[dict] = None) -> list[dict]:
+        # noinspection PyProtectedMember
+        return self.shards[0]._make_comments_tree(comments, comments if all_comments is None else all_comments)
+
+
+class ShardedDatabase:
+    shards_setting: str = "SHARDS"
+
+    def __init__(self, paths: Iterable[str | PathLike | Path], strategy: ShardStrategy = None, *,
+                 init: bool = False, check_connections: bool = True, check_version: bool = True,
+                 read_only: bool = False, read_optimized: bool = False, workers: int = None):
+        paths = [Path(p) for p in paths]
+        if init:
+            for path in paths:
+                path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.shards: list[Database] = [
+            Database(p, init=init, check_connections=check_connections, check_version=check_version,
+                     read_only=read_only, check_same_thread=False, read_optimized=read_optimized)
+            for p in paths
+        ]
+
+        if strategy is None:
+            if (setting := self.primary.settings[self.shards_setting]) is None:
+                raise ValueError("No shard strategy given or saved in the primary shard")
+            strategy = ShardStrategy.from_setting(loads(setting))
+        elif not read_only and not read_optimized:
+            self.primary.settings[self.shards_setting] = dumps(strategy.to_setting())
+
+        if strategy.count != len(self.shards):
+            raise ValueError(f"Strategy {strategy!r} requires {strategy.count} shards, {len(self.shards)} given")
+
+        self.strategy: ShardStrategy = strategy
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(workers or len(self.shards))
+
+        self.submissions: ShardedSubmissionsTable = ShardedSubmissionsTable(self, self.primary.submissions.name)
+        self.journals: ShardedJournalsTable = ShardedJournalsTable(self, self.primary.journals.name)
+        self.comments: ShardedCommentsTable = ShardedCommentsTable(self, self.primary.comments.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_val, _exc_tb):
+        self.close()
+
+    @property
+    def primary(self) -> Database:
+        return self.shards[0]
+
+    @property
+    def users(self):
+        return self.primary.users
+
+    @property
+    def settings(self):
+        return self.primary.settings
+
+    @property
+    def history(self):
+        return self.primary.history
+
+    @property
+    def is_clean(self) -> bool:
+        return all(db.is_clean for db in self.shards)
+
+    def commit(self):
+        for db in self.shards:
+            db.commit()
+
+    def rollback(self):
+        for db in self.shards:
+            if db.connection.in_transaction:
+                db.rollback()
+
+    def rebalance(self, bounds: Iterable[int]):
+        if not isinstance(self.strategy, IDRangeStrategy):
+            raise ValueError("Only ID range shards can be rebalanced")
+        elif (strategy := IDRangeStrategy(bounds)).count != len(self.shards):
+            raise ValueError(f"Strategy {strategy!r} requires {strategy.count} shards, {len(self.shards)} exist")
+
+        # Every shard is rolled back if a move fails, the shards are committed one after the other when all moves are
+        # done and only then the files of the moved submissions are deleted from their old shard
+        moved_files: list[Path] = []
+        with ExitStack() as transactions:
+            for db in self.shards:
+                transactions.enter_context(db.transaction())
+            for table in (self.submissions, self.journals, self.comments):
+                key: str = CommentsColumns.PARENT_ID.name if table is self.comments else table.key.name
+                for source_index, source in enumerate(table.shards):
+                    for target_index, target in enumerate(table.shards):
+                        if source_index == target_index:
+                            continue
+                        low, high = strategy.range(target_index)
+                        query: Selector = {AND: [s for s in ({GE: {key: low}} if low is not None else None,
+                                                             {LT: {key: high}} if high is not None else None) if s]}
+                        if query[AND] and next(iter(source.select(query, [key], limit=1)), None):
+                            moved_files.extend(table.move(query, target, source))
+            self.primary.settings[self.shards_setting] = dumps(strategy.to_setting())
+
+        self.strategy = strategy
+        self.commit()
+        for file in moved_files:
+            file.unlink(missing_ok=True)
+
+    def close(self):
+        self.executor.shutdown()
+        for db in self.shards:
+            db.close()
+
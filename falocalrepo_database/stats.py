@@ -0,0 +1,112 @@
+from sqlite3 import OperationalError
+from typing import Any
+from typing import Callable
+from typing import TYPE_CHECKING
+
+from .tables import SubmissionsColumns
+from .tables import submissions_table
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__ = [
+    "Statistics",
+    "split_list_sql",
+]
+
+
+# Recursive CTE split_list(KEY, VALUE, REST) with one row per element of a |a||b| list column
+# noinspection SqlNoDataSourceInspection
+def split_list_sql(table: str, column: str, key: str = "ROWID", where: str = "") -> str:
+    return f"""with recursive split_list(KEY, VALUE, REST) as (
+        select {key}, null, substr({column}, 2, length({column}) - 2) || '||'
+        from {table} where {column} != ''{f' and ({where})' if where else ''}
+        union all
+        select KEY, substr(REST, 1, instr(REST, '||') - 1), substr(REST, instr(REST, '||') + 2)
+        from split_list where REST != ''
+    )"""
+
+
+class Statistics:
+    def __init__(self, database: 'Database'):
+        self.database: 'Database' = database
+        self._cache: dict[tuple, Any] = {}
+        self._cache_version: tuple[int, int] | None = None
+
+    @property
+    def data_version(self) -> tuple[int, int]:
+        return self.database.execute("pragma data_version").fetchone()[0], self.database.total_changes
+
+    def _cached(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        if (version := self.data_version) != self._cache_version:
+            self._cache.clear()
+            self._cache_version = version
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._cache_version = None
+
+    def _list_frequencies(self, table: str, column: str, limit: int) -> list[tuple[str, int]]:
+        return self._cached(("list", table, column, limit), lambda: [
+            (value, count) for value, count in self.database.execute(
+                f"""{split_list_sql(table, column)}
+                select VALUE, count(*) as N from split_list where VALUE is not null and VALUE != ''
+                group by VALUE order by N desc, VALUE{f' limit {limit}' if limit > 0 else ''}""")
+        ])
+
+    def counts(self) -> dict[str, int]:
+        return self._cached(("counts",), lambda: {
+            t.name: self.database.execute(f"select count(*) from {t.name}").fetchone()[0]
+            for t in self.database.tables
+        })
+
+    def authors(self, table: str = submissions_table, limit: int = 0) -> list[tuple[str, int]]:
+        return self._cached(("authors", table.upper(), limit), lambda: [
+            (author, count) for author, count in self.database.execute(
+                f"""select AUTHOR, count(*) as N from {table.upper()} group by AUTHOR order by N desc, AUTHOR
+                {f'limit {limit}' if limit > 0 else ''}""")
+        ])
+
+    def years(self, table: str = submissions_table) -> dict[int, int]:
+        return self._cached(("years", table.upper()), lambda: {
+            int(year): count for year, count in self.database.execute(
+                f"""select {"strftime('%Y', DATE, 'unixepoch')" if self.database.settings.epoch_dates else
+                            'substr(DATE, 1, 4)'} as Y, count(*) from {table.upper()} group by Y order by Y""")
+        })
+
+    def tags(self, limit: int = 0) -> list[tuple[str, int]]:
+        return self._list_frequencies(submissions_table, SubmissionsColumns.TAGS.name, limit)
+
+    def favorites(self, limit: int = 0) -> list[tuple[str, int]]:
+        return self._list_frequencies(submissions_table, SubmissionsColumns.FAVORITE.name, limit)
+
+    def mentions(self, table: str = submissions_table, limit: int = 0) -> list[tuple[str, int]]:
+        return self._list_frequencies(table.upper(), SubmissionsColumns.MENTIONS.name, limit)
+
+    def most_favorited(self, limit: int = 10) -> list[tuple[int, int]]:
+        return self._cached(("most_favorited", limit), lambda: [
+            (id_, count) for id_, count in self.database.execute(
+                f"""{split_list_sql(submissions_table, SubmissionsColumns.FAVORITE.name,
+                                    SubmissionsColumns.ID.name)}
+                select KEY, count(*) as N from split_list where VALUE is not null and VALUE != ''
+                group by KEY order by N desc, KEY{f' limit {limit}' if limit > 0 else ''}""")
+        ])
+
+    def storage(self) -> dict[str, int]:
+        def compute() -> dict[str, int]:
+            page_size: int = self.database.execute("pragma page_size").fetchone()[0]
+            result: dict[str, int] = {
+                "database": self.database.execute("pragma page_count").fetchone()[0] * page_size,
+                "free": self.database.execute("pragma freelist_count").fetchone()[0] * page_size,
+            }
+            try:
+                result |= {name: size for name, size in self.database.execute(
+                    "select name, sum(pgsize) from dbstat group by name order by name")}
+            except OperationalError:
+                pass
+            return result
+
+        return self._cached(("storage",), compute)
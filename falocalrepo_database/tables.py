@@ -1,4 +1,5 @@
 from datetime import datetime
+from datetime import timedelta
 
 from .column import Column
 from .column import parse_list
@@ -11,12 +12,22 @@ __all__ = [
     "comments_table",
     "settings_table",
     "history_table",
+    "user_stats_table",
+    "changes_table",
+    "thumbnails_table",
     "UsersColumns",
     "SubmissionsColumns",
     "JournalsColumns",
     "CommentsColumns",
     "SettingsColumns",
     "HistoryColumns",
+    "UserStatsColumns",
+    "ChangesColumns",
+    "ThumbnailsColumns",
+    "search_indexes",
+    "search_text_columns",
+    "epoch_date_columns",
+    "compressed_text_columns",
 ]
 
 users_table: str = "USERS"
@@ -25,6 +36,19 @@ journals_table: str = "JOURNALS"
 comments_table: str = "COMMENTS"
 settings_table: str = "SETTINGS"
 history_table: str = "HISTORY"
+user_stats_table: str = "USER_STATS"
+changes_table: str = "CHANGES"
+thumbnails_table: str = "THUMBNAILS"
+
+
+def _format_json_list(value: list) -> str:
+    from json import dumps
+    return dumps(list(value))
+
+
+def _parse_json_list(value: str) -> list:
+    from json import loads
+    return loads(value)
 
 
 class Columns:
@@ -83,7 +107,7 @@ class CommentsColumns(Columns):
     REPLY_TO: Column = Column("REPLY_TO", int, not_null=False, check="{name} == null or {name} > 0")
     AUTHOR: Column = Column("AUTHOR", str, check="length({name}) > 0")
     DATE: Column = Column("DATE", datetime, to_entry=lambda v: v.strftime("%Y-%m-%dT%H:%M:%S"),
-                          from_entry=lambda v: datetime.strptime(v, "%Y-%m-%dT%H:%M:%S"))
+                          from_entry=datetime.fromisoformat)
     TEXT: Column = Column("TEXT", str)
 
 
@@ -95,5 +119,61 @@ class SettingsColumns(Columns):
 class HistoryColumns(Columns):
     TIME: Column = Column("TIME", datetime, unique=True, key=True,
                           to_entry=lambda v: v.strftime("%Y-%m-%dT%H:%M:%S.%f"),
-                          from_entry=lambda v: datetime.strptime(v, "%Y-%m-%dT%H:%M:%S.%f"))
+                          from_entry=datetime.fromisoformat)
     EVENT: Column = Column("EVENT", str)
+
+
+class UserStatsColumns(Columns):
+    USERNAME: Column = Column("USERNAME", str, unique=True, key=True, to_entry=clean_username)
+    SUBMISSIONS: Column = Column("SUBMISSIONS", int, default=0)
+    JOURNALS: Column = Column("JOURNALS", int, default=0)
+    FAVORITES: Column = Column("FAVORITES", int, default=0)
+    COMMENTS: Column = Column("COMMENTS", int, default=0)
+    LAST_UPLOAD: Column = Column("LAST_UPLOAD", datetime, not_null=False, default=None)
+
+
+class ChangesColumns(Columns):
+    SEQ: Column = Column("SEQ", int, unique=True, key=True)
+    TABLE_NAME: Column = Column("TABLE_NAME", str)
+    ROW_KEY: Column = Column("ROW_KEY", list, to_entry=_format_json_list, from_entry=_parse_json_list)
+    OPERATION: Column = Column("OPERATION", str, check="{name} in ('insert', 'update', 'delete')")
+
+
+class ThumbnailsColumns(Columns):
+    ID: Column = Column("ID", int, unique=True, key=True, check="{name} > 0")
+    THUMBNAIL: Column = Column("THUMBNAIL", bytes)
+
+
+# Secondary indexes for the equality and range searches generated by select_query
+search_indexes: dict[str, list[str]] = {
+    submissions_table: [f"{SubmissionsColumns.AUTHOR.name} collate nocase", SubmissionsColumns.DATE.name],
+    journals_table: [f"{JournalsColumns.AUTHOR.name} collate nocase", JournalsColumns.DATE.name],
+    comments_table: [CommentsColumns.DATE.name],
+}
+
+
+# Markup columns that get a shadow table with their lowercased plain text for select_query searches
+search_text_columns: dict[str, Column] = {
+    users_table: UsersColumns.USERPAGE,
+    submissions_table: SubmissionsColumns.DESCRIPTION,
+    journals_table: JournalsColumns.CONTENT,
+}
+
+
+# Datetime columns that can be stored as integer offsets from the epoch: unit of the offsets, SQLite format of the text
+epoch_date_columns: dict[str, tuple[Column, timedelta, str]] = {
+    submissions_table: (SubmissionsColumns.DATE, timedelta(seconds=1), "%Y-%m-%dT%H:%M"),
+    journals_table: (JournalsColumns.DATE, timedelta(seconds=1), "%Y-%m-%dT%H:%M"),
+    comments_table: (CommentsColumns.DATE, timedelta(seconds=1), "%Y-%m-%dT%H:%M:%S"),
+    history_table: (HistoryColumns.TIME, timedelta(microseconds=1), "%Y-%m-%dT%H:%M:%S"),
+    user_stats_table: (UserStatsColumns.LAST_UPLOAD, timedelta(seconds=1), "%Y-%m-%dT%H:%M"),
+}
+
+
+# Markup columns that can be stored compressed with a dictionary shared by all of them
+compressed_text_columns: dict[str, list[Column]] = {
+    users_table: [UsersColumns.USERPAGE],
+    submissions_table: [SubmissionsColumns.DESCRIPTION, SubmissionsColumns.FOOTER],
+    journals_table: [JournalsColumns.CONTENT, JournalsColumns.HEADER, JournalsColumns.FOOTER],
+    comments_table: [CommentsColumns.TEXT],
+}
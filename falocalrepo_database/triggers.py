@@ -0,0 +1,269 @@
+from .stats import split_list_sql
+from .tables import ChangesColumns
+from .tables import Columns
+from .tables import CommentsColumns
+from .tables import JournalsColumns
+from .tables import SubmissionsColumns
+from .tables import UserStatsColumns
+from .tables import UsersColumns
+from .tables import changes_table
+from .tables import comments_table
+from .tables import journals_table
+from .tables import submissions_table
+from .tables import user_stats_table
+from .tables import users_table
+
+__all__ = [
+    "username_sql",
+    "list_json_sql",
+    "user_stats_indexes",
+    "user_stats_triggers",
+    "user_stats_rebuild",
+    "user_stats_replaced_table",
+    "change_log_replaced_table",
+    "replaced_rows_create",
+    "change_log_tables",
+    "change_log_create",
+    "change_log_triggers",
+    "search_text_triggers",
+]
+
+_S = SubmissionsColumns
+_J = JournalsColumns
+_C = CommentsColumns
+_U = UserStatsColumns
+_CH = ChangesColumns
+
+user_stats_replaced_table: str = f"{user_stats_table}_REPLACED"
+change_log_replaced_table: str = f"{changes_table}_REPLACED"
+
+change_log_tables: dict[str, type[Columns]] = {
+    users_table: UsersColumns,
+    submissions_table: SubmissionsColumns,
+    journals_table: JournalsColumns,
+    comments_table: CommentsColumns,
+}
+
+
+# SQL equivalent of util.clean_username for FurAffinity usernames (underscores are removed, and case is ignored)
+def username_sql(column: str) -> str:
+    return f"lower(replace({column}, '_', ''))"
+
+
+# JSON array from a |a||b| list column so it can be expanded with json_each (CTEs are not allowed inside triggers)
+def list_json_sql(column: str) -> str:
+    return (f"""'["' || replace(replace(replace(substr({column}, 2, length({column}) - 2), """
+            f"""'\\', '\\\\'), '"', '\\"'), '||', '","') || '"]'""")
+
+
+def _increment(username: str, column: str, date: str = "null") -> str:
+    return f"""insert into {user_stats_table}
+        ({_U.USERNAME.name}, {_U.SUBMISSIONS.name}, {_U.JOURNALS.name}, {_U.FAVORITES.name}, {_U.COMMENTS.name},
+        {_U.LAST_UPLOAD.name})
+        select {username}, {', '.join('1' if c.name == column else '0' for c in
+                                      (_U.SUBMISSIONS, _U.JOURNALS, _U.FAVORITES, _U.COMMENTS))}, {date} where true
+        on conflict ({_U.USERNAME.name}) do update set {column} = {column} + 1,
+        {_U.LAST_UPLOAD.name} = max(coalesce({_U.LAST_UPLOAD.name}, excluded.{_U.LAST_UPLOAD.name}),
+                                    coalesce(excluded.{_U.LAST_UPLOAD.name}, {_U.LAST_UPLOAD.name}));"""
+
+
+def _increment_favorites(favorites: str) -> str:
+    return f"""insert into {user_stats_table}
+        ({_U.USERNAME.name}, {_U.SUBMISSIONS.name}, {_U.JOURNALS.name}, {_U.FAVORITES.name}, {_U.COMMENTS.name})
+        select value, 0, 0, 1, 0 from json_each({list_json_sql(favorites)}) where value != ''
+        on conflict ({_U.USERNAME.name}) do update set {_U.FAVORITES.name} = {_U.FAVORITES.name} + 1;"""
+
+
+def _last_upload(username: str) -> str:
+    return f"""(select max(D) from (
+        select max({_S.DATE.name}) as D from {submissions_table} where {username_sql(_S.AUTHOR.name)} = {username}
+        union all
+        select max({_J.DATE.name}) as D from {journals_table} where {username_sql(_J.AUTHOR.name)} = {username}))"""
+
+
+def _decrement(username: str, column: str, date: str = None) -> str:
+    sql: str = f"""update {user_stats_table} set {column} = {column} - 1 where {_U.USERNAME.name} = {username};"""
+    if date is not None:
+        sql += f"""
+        update {user_stats_table} set {_U.LAST_UPLOAD.name} = {_last_upload(_U.USERNAME.name)}
+        where {_U.USERNAME.name} = {username} and {_U.LAST_UPLOAD.name} = {date};"""
+    return sql
+
+
+def _decrement_favorites(favorites: str) -> str:
+    return f"""update {user_stats_table} set {_U.FAVORITES.name} = {_U.FAVORITES.name} - 1
+        where {_U.USERNAME.name} in (select value from json_each({list_json_sql(favorites)}));"""
+
+
+def _remove_empty() -> str:
+    return f"""delete from {user_stats_table} where {_U.SUBMISSIONS.name} <= 0 and {_U.JOURNALS.name} <= 0
+        and {_U.FAVORITES.name} <= 0 and {_U.COMMENTS.name} <= 0;"""
+
+
+def _trigger(name: str, event: str, table: str, *statements: str, before: bool = False, when: str = "") -> str:
+    return f"create trigger if not exists {name} {'before' if before else 'after'} {event} on {table}" + \
+        (f" when {when}" if when else "") + " begin\n" + "\n".join(statements) + "\nend"
+
+
+# Rows replaced by INSERT OR REPLACE only fire the delete triggers if the connection that writes them has recursive
+# triggers enabled. The row with the same key is saved before each insert and cleared by the delete triggers, so the
+# insert triggers can apply the delete themselves when it is still there. Rows saved before an ignored insert are
+# cleared by the next one.
+def replaced_rows_create(replaced_table: str) -> str:
+    return f"create table if not exists {replaced_table} (TABLE_NAME text not null, ROW text not null)"
+
+
+def _save_replaced(replaced_table: str, table: str, keys: list[str], columns: list[str]) -> list[str]:
+    return [_clear_replaced(replaced_table, table),
+            f"""insert into {replaced_table} (TABLE_NAME, ROW)
+        select '{table}', json_object({', '.join(f"'{c}', {c}" for c in columns)}) from {table}
+        where {' and '.join(f'{k} = new.{k}' for k in keys)};"""]
+
+
+def _clear_replaced(replaced_table: str, table: str) -> str:
+    return f"delete from {replaced_table} where TABLE_NAME = '{table}';"
+
+
+def _is_replaced(replaced_table: str, table: str) -> str:
+    return f"exists (select 1 from {replaced_table} where TABLE_NAME = '{table}')"
+
+
+def _replaced(replaced_table: str, table: str, column: str) -> str:
+    return f"(select json_extract(ROW, '$.{column}') from {replaced_table} where TABLE_NAME = '{table}')"
+
+
+def user_stats_indexes() -> list[str]:
+    return [
+        f"create index if not exists {user_stats_table}_{submissions_table} on {submissions_table} "
+        f"({username_sql(_S.AUTHOR.name)}, {_S.DATE.name})",
+        f"create index if not exists {user_stats_table}_{journals_table} on {journals_table} "
+        f"({username_sql(_J.AUTHOR.name)}, {_J.DATE.name})",
+    ]
+
+
+def _user_stats_replace_triggers(table: str, keys: list[str], columns: list[str], *delete: str) -> list[str]:
+    return [
+        _trigger(f"{user_stats_table}_{table}_REPLACING", "insert", table,
+                 *_save_replaced(user_stats_replaced_table, table, keys, columns), before=True),
+        _trigger(f"{user_stats_table}_{table}_REPLACED", "insert", table,
+                 *delete, _clear_replaced(user_stats_replaced_table, table),
+                 when=_is_replaced(user_stats_replaced_table, table)),
+    ]
+
+
+def user_stats_triggers() -> list[str]:
+    saved: str = user_stats_replaced_table
+    s_insert: list[str] = [_increment(username_sql(f"new.{_S.AUTHOR.name}"), _U.SUBMISSIONS.name,
+                                      f"new.{_S.DATE.name}"),
+                           _increment_favorites(f"new.{_S.FAVORITE.name}")]
+    s_delete: list[str] = [_decrement(username_sql(f"old.{_S.AUTHOR.name}"), _U.SUBMISSIONS.name,
+                                      f"old.{_S.DATE.name}"),
+                           _decrement_favorites(f"old.{_S.FAVORITE.name}"),
+                           _remove_empty()]
+    j_insert: list[str] = [_increment(username_sql(f"new.{_J.AUTHOR.name}"), _U.JOURNALS.name,
+                                      f"new.{_J.DATE.name}")]
+    j_delete: list[str] = [_decrement(username_sql(f"old.{_J.AUTHOR.name}"), _U.JOURNALS.name,
+                                      f"old.{_J.DATE.name}"),
+                           _remove_empty()]
+    c_insert: list[str] = [_increment(username_sql(f"new.{_C.AUTHOR.name}"), _U.COMMENTS.name)]
+    c_delete: list[str] = [_decrement(username_sql(f"old.{_C.AUTHOR.name}"), _U.COMMENTS.name), _remove_empty()]
+    s_replaced: list[str] = [_decrement(username_sql(_replaced(saved, submissions_table, _S.AUTHOR.name)),
+                                        _U.SUBMISSIONS.name, _replaced(saved, submissions_table, _S.DATE.name)),
+                             _decrement_favorites(_replaced(saved, submissions_table, _S.FAVORITE.name)),
+                             _remove_empty()]
+    j_replaced: list[str] = [_decrement(username_sql(_replaced(saved, journals_table, _J.AUTHOR.name)),
+                                        _U.JOURNALS.name, _replaced(saved, journals_table, _J.DATE.name)),
+                             _remove_empty()]
+    c_replaced: list[str] = [_decrement(username_sql(_replaced(saved, comments_table, _C.AUTHOR.name)),
+                                        _U.COMMENTS.name),
+                             _remove_empty()]
+
+    return [
+        *_user_stats_replace_triggers(submissions_table, [_S.ID.name],
+                                      [_S.AUTHOR.name, _S.DATE.name, _S.FAVORITE.name], *s_replaced),
+        *_user_stats_replace_triggers(journals_table, [_J.ID.name], [_J.AUTHOR.name, _J.DATE.name], *j_replaced),
+        *_user_stats_replace_triggers(comments_table, [c.name for c in _C.as_list() if c.key], [_C.AUTHOR.name],
+                                      *c_replaced),
+        _trigger(f"{user_stats_table}_{submissions_table}_INSERT", "insert", submissions_table, *s_insert),
+        _trigger(f"{user_stats_table}_{submissions_table}_DELETE", "delete", submissions_table, *s_delete,
+                 _clear_replaced(saved, submissions_table)),
+        _trigger(f"{user_stats_table}_{submissions_table}_UPDATE",
+                 f"update of {_S.AUTHOR.name}, {_S.DATE.name}, {_S.FAVORITE.name}", submissions_table,
+                 *s_delete, *s_insert),
+        _trigger(f"{user_stats_table}_{journals_table}_INSERT", "insert", journals_table, *j_insert),
+        _trigger(f"{user_stats_table}_{journals_table}_DELETE", "delete", journals_table, *j_delete,
+                 _clear_replaced(saved, journals_table)),
+        _trigger(f"{user_stats_table}_{journals_table}_UPDATE", f"update of {_J.AUTHOR.name}, {_J.DATE.name}",
+                 journals_table, *j_delete, *j_insert),
+        _trigger(f"{user_stats_table}_{comments_table}_INSERT", "insert", comments_table, *c_insert),
+        _trigger(f"{user_stats_table}_{comments_table}_DELETE", "delete", comments_table, *c_delete,
+                 _clear_replaced(saved, comments_table)),
+        _trigger(f"{user_stats_table}_{comments_table}_UPDATE", f"update of {_C.AUTHOR.name}", comments_table,
+                 *c_delete, *c_insert),
+    ]
+
+
+def user_stats_rebuild() -> str:
+    return f"""{split_list_sql(submissions_table, _S.FAVORITE.name)}
+    insert into {user_stats_table}
+    ({_U.USERNAME.name}, {_U.SUBMISSIONS.name}, {_U.JOURNALS.name}, {_U.FAVORITES.name}, {_U.COMMENTS.name},
+    {_U.LAST_UPLOAD.name})
+    select U, sum(S), sum(J), sum(F), sum(C), max(L) from (
+        select {username_sql(_S.AUTHOR.name)} as U, count(*) as S, 0 as J, 0 as F, 0 as C, max({_S.DATE.name}) as L
+        from {submissions_table} group by U
+        union all
+        select {username_sql(_J.AUTHOR.name)} as U, 0, count(*), 0, 0, max({_J.DATE.name})
+        from {journals_table} group by U
+        union all
+        select {username_sql(_C.AUTHOR.name)} as U, 0, 0, 0, count(*), null from {comments_table} group by U
+        union all
+        select VALUE as U, 0, 0, count(*), 0, null from split_list where VALUE is not null and VALUE != ''
+        group by U
+    ) group by U"""
+
+
+# AUTOINCREMENT guarantees that sequence numbers are never reused after old changes are pruned
+def change_log_create(exists_ignore: bool = False) -> str:
+    return f"""create table{' if not exists' * exists_ignore} {changes_table}
+    ({_CH.SEQ.name} integer primary key autoincrement,
+    {_CH.TABLE_NAME.name} text not null,
+    {_CH.ROW_KEY.name} text not null,
+    {_CH.OPERATION.name} {_CH.OPERATION.sql_type} not null check ({_CH.OPERATION.check}))"""
+
+
+def _log_change(table: str, keys: list[str], row: str, operation: str, where: str = "") -> str:
+    return f"""insert into {changes_table} ({_CH.TABLE_NAME.name}, {_CH.ROW_KEY.name}, {_CH.OPERATION.name})
+        select '{table}', json_array({', '.join(f'{row}.{k}' for k in keys)}), '{operation}'
+        {f'where {where}' if where else ''};"""
+
+
+def change_log_triggers() -> list[str]:
+    triggers: list[str] = []
+    for table, columns in change_log_tables.items():
+        keys: list[str] = [c.name for c in columns.as_list() if c.key]
+        key_changed: str = " or ".join(f"old.{k} is not new.{k}" for k in keys)
+        triggers.extend([
+            _trigger(f"{changes_table}_{table}_REPLACING", "insert", table,
+                     *_save_replaced(change_log_replaced_table, table, keys, keys), before=True),
+            _trigger(f"{changes_table}_{table}_INSERT", "insert", table,
+                     _log_change(table, keys, "new", "delete", _is_replaced(change_log_replaced_table, table)),
+                     _clear_replaced(change_log_replaced_table, table),
+                     _log_change(table, keys, "new", "insert")),
+            _trigger(f"{changes_table}_{table}_UPDATE", "update", table,
+                     _log_change(table, keys, "old", "delete", key_changed),
+                     _log_change(table, keys, "new", "update")),
+            _trigger(f"{changes_table}_{table}_DELETE", "delete", table, _log_change(table, keys, "old", "delete"),
+                     _clear_replaced(change_log_replaced_table, table)),
+        ])
+    return triggers
+
+
+# Shadow rows are removed whenever the source row changes, the new text is written by the library after the statement,
+# rows changed by other clients are filled again by SearchTable.populate
+def search_text_triggers(search_table: str, table: str, key: str, column: str) -> list[str]:
+    return [
+        _trigger(f"{search_table}_INSERT", "insert", table, f"delete from {search_table} where {key} = new.{key};"),
+        _trigger(f"{search_table}_UPDATE", f"update of {key}, {column}", table,
+                 f"delete from {search_table} where {key} in (old.{key}, new.{key});"),
+        _trigger(f"{search_table}_DELETE", "delete", table, f"delete from {search_table} where {key} = old.{key};"),
+    ]
@@ -1,26 +1,32 @@
+from datetime import datetime
+from datetime import timedelta
 from pathlib import Path
 from re import match
 from re import split
 from re import sub
-
-from chardet import detect as detect_encoding
-from filetype import guess_extension as filetype_guess_extension
-from psutil import AccessDenied
-from psutil import NoSuchProcess
-from psutil import Process
-from psutil import process_iter
+from typing import Callable
+from typing import TYPE_CHECKING
 
 from .__version__ import __version__
+from .column import epoch
 from .exceptions import MultipleConnections
 from .exceptions import VersionError
 
+if TYPE_CHECKING:
+    from psutil import Process
+
 __all__ = [
     "compare_version",
     "find_connections",
+    "is_immutable",
+    "file_stamp",
     "clean_username",
     "guess_extension",
     "tiered_path",
     "format_value",
+    "date_range",
+    "epoch_range",
+    "search_text",
     "query_to_sql",
 ]
 
@@ -54,7 +60,11 @@ def compare_version(version_a: str, *, major: bool = True, minor: bool = True, p
 
 
 def find_connections(path: Path, raise_for_limit: bool = False, limit: int = 0) -> list:
-    ps: list[Process] = []
+    from psutil import AccessDenied
+    from psutil import NoSuchProcess
+    from psutil import process_iter
+
+    ps: list["Process"] = []
     path_: str = str(path.resolve())
     for process in process_iter():
         try:
@@ -67,11 +77,29 @@ def find_connections(path: Path, raise_for_limit: bool = False, limit: int = 0)
     return ps
 
 
+# A database file can only be safely opened as immutable if nobody can write to it and no journal is left to replay
+def is_immutable(path: Path) -> bool:
+    try:
+        if path.stat().st_mode & 0o222:
+            return False
+    except FileNotFoundError:
+        return False
+    return not any(path.with_name(path.name + s).exists() for s in ("-wal", "-journal"))
+
+
+# Modification time and size of a database file and its WAL, changes whenever a write is checkpointed or committed
+def file_stamp(path: Path) -> list[tuple[int, int]]:
+    return [(stat.st_mtime_ns, stat.st_size) for p in (path, path.with_name(path.name + "-wal"))
+            if p.is_file() and (stat := p.stat())]
+
+
 def clean_username(username: str) -> str:
     return str(sub(r"[^a-z\d`.~\[\]\-]", "", username.lower().strip()))
 
 
 def check_plain_text(file: bytes) -> bool:
+    from chardet import detect as detect_encoding
+
     result: dict = detect_encoding(file[:2048])
     if str(result.get("encoding", "") or "").upper() in _encodings and result.get("confidence", 0) > .9:
         return True
@@ -80,6 +108,8 @@ def check_plain_text(file: bytes) -> bool:
 
 
 def guess_extension(file: bytes | None, default: str = "") -> str:
+    from filetype import guess_extension as filetype_guess_extension
+
     if (default := default.lower()) == "jpg":
         default = "jpeg"
 
@@ -109,12 +139,136 @@ def format_value(value: str, *, like: bool = False) -> str:
     return value
 
 
-def query_to_sql(query: str, default_field: str, likes: list[str] = None, aliases: dict[str, str] = None
-                 ) -> tuple[list[str], list[str]]:
+# Upper bound for prefix range scans, every string that starts with the prefix sorts before prefix + max character
+_max_char: str = "\U0010ffff"
+_date_padding: str = "0000-01-01T00:00"
+
+
+def search_text(markup: str | None) -> str:
+    from html import unescape
+
+    text: str = sub(r"<[^>]*>|\[/?(?:\w+|\*)(?:=[^]]*)?]", " ", markup or "")
+    return " ".join(unescape(text).lower().split())
+
+
+def _like_literal(pattern: str) -> tuple[str, bool] | None:
+    literal: list[str] = []
+    escaped: bool = False
+    for n, c in enumerate(pattern):
+        if escaped:
+            literal.append(c)
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c == "%" and n == len(pattern) - 1 and literal:
+            return "".join(literal), True
+        elif c in "%_":
+            return None
+        else:
+            literal.append(c)
+    return None if escaped else ("".join(literal), False)
+
+
+def _number(value: str) -> int | float | None:
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+
+# Start (inclusive) and end (exclusive) of the period covered by a partial date like 2020, 2020-05, or 2020-05-01T10
+def date_range(value: str) -> tuple[str, str] | None:
+    if not match(r"^\d{4}(-\d{2}(-\d{2}(T\d{2}(:\d{2}(:\d{2})?)?)?)?)?$", value := value.upper()):
+        return None
+    return value + _date_padding[len(value):], value + _max_char
+
+
+# Same period as date_range as whole units since the epoch, for dates stored as integers
+def epoch_range(value: str, unit: timedelta = timedelta(seconds=1)) -> tuple[int, int] | None:
+    if (period := date_range(value)) is None:
+        return None
+    try:
+        start: datetime = datetime.fromisoformat(period[0])
+    except ValueError:
+        return None
+    if len(value) == 4:
+        end: datetime = start.replace(year=start.year + 1)
+    elif len(value) == 7:
+        end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    else:
+        end = start + {10: timedelta(days=1), 13: timedelta(hours=1), 16: timedelta(minutes=1)}.get(
+            len(value), timedelta(seconds=1))
+    return (start - epoch) // unit, (end - epoch) // unit
+
+
+def _comparison_to_sql(column: str, value: str, number: bool, date: Callable[[str], tuple | None] | None
+                       ) -> tuple[str, list] | None:
+    if m := match(r"^(.*?)\.\.(.*)$", value):
+        low, high = m.groups()
+        if not low and not high:
+            return None
+        elements: list[str] = []
+        values: list = []
+        for bound, operator in ((low, ">="), (high, "<=")):
+            if bound and (sql := _comparison_to_sql(column, operator + bound, number, date)) is None:
+                return None
+            elif bound:
+                elements.append(sql[0])
+                values.extend(sql[1])
+        return " and ".join(elements), values
+    elif not (m := match(r"^(<=|>=|<|>|=)(.+)$", value)):
+        return None
+
+    operator, value = m.groups()
+    if number:
+        return None if (n := _number(value)) is None else (f"{column} {operator} ?", [n])
+    elif (period := date(value)) is None:
+        return None
+    elif operator == "=":
+        return f"{column} >= ? and {column} < ?", list(period)
+    elif operator in (">=", "<"):
+        return f"{column} {operator} ?", [period[0]]
+    else:
+        return f"{column} {'>=' if operator == '>' else '<'} ?", [period[1]]
+
+
+# Exact terms become equality checks and anchored prefixes become range scans so that SQLite can use indexes, text
+# comparisons use the NOCASE collation to keep the case-insensitive behaviour of LIKE
+def _term_to_sql(column: str, value: str, like: bool, number: bool, date: Callable[[str], tuple | None] | None
+                 ) -> tuple[str, list]:
+    if (number or date) and not value.startswith('"') and \
+            (comparison := _comparison_to_sql(column, value, number, date)) is not None:
+        return comparison
+
+    pattern: str = format_value(value, like=like)
+    if (literal := _like_literal(pattern)) is None:
+        return f"{column} like ? escape '\\'", [pattern]
+
+    text, prefix = literal
+    if number:
+        return (f"{column} = ?", [n]) if not prefix and (n := _number(text)) is not None else \
+            (f"{column} like ? escape '\\'", [pattern])
+    elif date:
+        return (f"{column} >= ? and {column} < ?", list(period)) if (period := date(text.rstrip("-T:"))) else \
+            (f"{column} like ? escape '\\'", [pattern])
+    elif prefix:
+        return f"{column} >= ? collate nocase and {column} < ? collate nocase", [text, text + _max_char]
+    else:
+        return f"{column} = ? collate nocase", [text]
+
+
+def query_to_sql(query: str, default_field: str, likes: list[str] = None, aliases: dict[str, str] = None,
+                 numbers: list[str] = None, dates: list[str] = None, searches: dict[str, str] = None,
+                 date_bounds: Callable[[str], tuple | None] = None) -> tuple[list[str], list[str]]:
     if not query:
         return [], []
 
     likes, aliases = likes or [], aliases or {}
+    numbers, dates, searches = numbers or [], dates or [], searches or {}
+    date_bounds = date_bounds or date_range
     elements: list[str] = []
     values: list[str] = []
 
@@ -138,8 +292,18 @@ def query_to_sql(query: str, default_field: str, likes: list[str] = None, aliase
             if not elem:
                 continue
             elements.append("and") if prev not in ("", "&", "|", "(") else None
-            elements.append(f"({aliases.get(field, field)}{' not' * bool(not_)} like ? escape '\\')")
-            values.append(format_value(elem, like=field in likes))
+            if field in aliases:
+                elements.append(f"({aliases[field]}{' not' * bool(not_)} like ? escape '\\')")
+                values.append(format_value(elem, like=field in likes))
+            elif field in searches:
+                sql, term_values = _term_to_sql(field, elem.lower(), field in likes, False, None)
+                elements.append(f"({searches[field].format(f'not ({sql})' if not_ else sql)})")
+                values.extend(term_values)
+            else:
+                sql, term_values = _term_to_sql(field, elem, field in likes, field in numbers,
+                                                date_bounds if field in dates else None)
+                elements.append(f"(not ({sql}))" if not_ else f"({sql})")
+                values.extend(term_values)
         prev = elem
 
     return elements, values